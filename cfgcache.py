@@ -0,0 +1,137 @@
+# vim:ts=4:et
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+import os
+import pickle
+from hashlib import sha1
+
+def default_cachedir():
+    base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, "cfgnode")
+
+class ParseCache:
+    # Pickled parse trees, one file per source path, under cachedir. An
+    # entry is used as is while the source's size and mtime are unchanged,
+    # and after a content hash check if only the mtime moved. Hits touch
+    # the entry so the least recently used ones are evicted first once
+    # max_bytes or max_entries is exceeded.
+    def __init__(self, cachedir=None, max_bytes=512 * 1024 * 1024,
+                 max_entries=None):
+        self.cachedir = cachedir or default_cachedir()
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.total = None
+        self.count = None
+        self.hits = self.misses = 0
+        os.makedirs(self.cachedir, exist_ok=True)
+    def entry(self, path, kind=None):
+        # kind keeps other products of the same source (eg a compiled
+        # form) apart from its parse tree
+        if kind:
+            path = kind + ":" + path
+        name = sha1(path.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.cachedir, name + ".pickle")
+    def load(self, path, parse, kind=None):
+        # parse(text) is called on the latin-1 decoded file on a miss
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.entry(path, kind)
+        data = None
+        tree = None
+        try:
+            with open(entry, "rb") as f:
+                key = pickle.load(f)
+                if key[0] == path and key[2] == st.st_size:
+                    if key[1] != st.st_mtime_ns:
+                        data = open(path, "rb").read()
+                        if sha1(data).digest() != key[3]:
+                            raise KeyError(path)
+                    tree = pickle.load(f)
+                    if data == None:
+                        os.utime(entry)
+                        self.hits += 1
+                        return tree
+                    # same contents, new mtime: store the new key below
+        except (OSError, EOFError, KeyError, IndexError,
+                pickle.UnpicklingError):
+            pass
+        if data == None:
+            data = open(path, "rb").read()
+        if tree == None:
+            self.misses += 1
+            tree = parse(data.decode("latin-1"))
+        else:
+            self.hits += 1
+        key = path, st.st_mtime_ns, st.st_size, sha1(data).digest()
+        self.store(entry, key, tree)
+        return tree
+    def store(self, entry, key, tree):
+        if self.total == None:
+            self.scan()
+        try:
+            old = os.stat(entry).st_size
+        except OSError:
+            old = None
+        tmp = "%s.%d.tmp" % (entry, os.getpid())
+        with open(tmp, "wb") as f:
+            pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(tree, f, pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        os.replace(tmp, entry)
+        if old != None:
+            self.total -= old
+            self.count -= 1
+        self.total += size
+        self.count += 1
+        if (self.total > self.max_bytes
+            or (self.max_entries != None and self.count > self.max_entries)):
+            self.evict(entry)
+    def scan(self):
+        entries = []
+        for e in os.scandir(self.cachedir):
+            if e.name.endswith(".pickle"):
+                st = e.stat()
+                entries.append((st.st_mtime_ns, st.st_size, e.path))
+        self.total = sum(e[1] for e in entries)
+        self.count = len(entries)
+        return entries
+    def evict(self, keep=None):
+        # drop the least recently used entries until back under the limits
+        entries = self.scan()
+        entries.sort()
+        for mtime, size, path in entries:
+            if (self.total <= self.max_bytes
+                and (self.max_entries == None
+                     or self.count <= self.max_entries)):
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total -= size
+            self.count -= 1
+    def clear(self):
+        for e in os.scandir(self.cachedir):
+            if e.name.endswith(".pickle"):
+                os.remove(e.path)
+        self.total = self.count = 0
@@ -0,0 +1,123 @@
+# vim:ts=4:et
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Bulk conversion of columns of config values (lists of strings) to
+# numbers. numpy is used when it is installed; the fallback gives the same
+# results in pure python.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def convert(strings, kind):
+    # kind(s) for each string: the converted values, with 0 in place of
+    # those that fail, and the indices of the failures
+    if numpy != None and strings:
+        dtype = numpy.float64 if kind == float else numpy.int64
+        try:
+            return numpy.array(strings).astype(dtype), []
+        except (ValueError, TypeError, OverflowError):
+            pass    # find the failures below
+    values = []
+    bad = []
+    append = values.append
+    for i, s in enumerate(strings):
+        try:
+            append(kind(s))
+        except (ValueError, TypeError, OverflowError):
+            append(0)
+            bad.append(i)
+    if numpy != None:
+        values = numpy.array(values, dtype=numpy.float64)
+    return values, bad
+
+def float_column(strings):
+    return convert(strings, float)
+
+def int_column(strings):
+    return convert(strings, int)
+
+def below(values, limit, inclusive=False):
+    # indices of the values < limit (<= limit if inclusive)
+    if numpy != None:
+        values = numpy.asarray(values)
+        if inclusive:
+            return numpy.nonzero(values <= limit)[0].tolist()
+        return numpy.nonzero(values < limit)[0].tolist()
+    if inclusive:
+        return [i for i, v in enumerate(values) if v <= limit]
+    return [i for i, v in enumerate(values) if v < limit]
+
+def split_column(strings, sep=","):
+    # the parts of each string as one flat column, and the index of the
+    # string each part came from and the number of parts of each string
+    parts = []
+    owners = []
+    counts = []
+    for i, s in enumerate(strings):
+        p = s.split(sep)
+        parts.extend(p)
+        owners.extend([i] * len(p))
+        counts.append(len(p))
+    return parts, owners, counts
+
+def multiply(*columns):
+    # the elementwise product of equal length columns
+    if numpy != None:
+        product = numpy.asarray(columns[0], dtype=numpy.float64)
+        for c in columns[1:]:
+            product = product * numpy.asarray(c, dtype=numpy.float64)
+        return product
+    return [_product(values) for values in zip(*columns)]
+
+def _product(values):
+    p = 1
+    for v in values:
+        p *= v
+    return p
+
+def add(a, b):
+    if numpy != None:
+        return numpy.asarray(a, dtype=numpy.float64) + numpy.asarray(b)
+    return [x + y for x, y in zip(a, b)]
+
+def sum_by(values, owners, count):
+    # the sums of values by owner (0 to count - 1)
+    if numpy != None:
+        return numpy.bincount(numpy.asarray(owners, dtype=numpy.intp),
+                              numpy.asarray(values, dtype=numpy.float64),
+                              count)
+    sums = [0.0] * count
+    for o, v in zip(owners, values):
+        sums[o] += v
+    return sums
+
+def where_equal(column, value):
+    # indices of the entries of column equal to value
+    if numpy != None:
+        return numpy.nonzero(numpy.asarray(column) == value)[0]
+    return [i for i, v in enumerate(column) if v == value]
+
+def take(column, indices):
+    if numpy != None:
+        return numpy.asarray(column)[indices]
+    return [column[i] for i in indices]
@@ -0,0 +1,140 @@
+# vim:ts=4:et
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+import json
+
+ERROR = "error"
+WARNING = "warning"
+NOTE = "note"       # extra information for the finding before it
+
+class Diagnostics:
+    # Findings as (path, line, severity, code, message, args) records. The
+    # message is only formatted with its args when the record is emitted.
+    def __init__(self):
+        self.records = []
+    def report(self, path, line, severity, code, message, *args):
+        self.records.append((path, line, severity, code, message, args))
+    def error(self, path, line, code, message, *args):
+        self.records.append((path, line, ERROR, code, message, args))
+    def warning(self, path, line, code, message, *args):
+        self.records.append((path, line, WARNING, code, message, args))
+    def note(self, path, line, code, message, *args):
+        self.records.append((path, line, NOTE, code, message, args))
+
+def format_message(record):
+    message, args = record[4], record[5]
+    if args:
+        return message.format(*args)
+    return message
+
+def filter_records(records, suppress=(), once=(), seen=None):
+    # Drop the findings whose code is in suppress, and all but the first
+    # per file of those whose code is in once. Notes go with the finding
+    # they follow. Pass the same seen set to filter records a piece at a
+    # time.
+    if seen == None:
+        seen = set()
+    keep = True
+    for record in records:
+        if record[2] != NOTE:
+            code = record[3]
+            keep = code not in suppress
+            if keep and code in once:
+                key = record[0], code
+                keep = key not in seen
+                seen.add(key)
+        if keep:
+            yield record
+
+def has_errors(records):
+    for record in records:
+        if record[2] == ERROR:
+            return True
+    return False
+
+def emit_text(records, out, batch=1024):
+    lines = []
+    for record in records:
+        path, line, severity = record[:3]
+        message = format_message(record)
+        if severity == ERROR:
+            lines.append(f"{path}:{line}: {message}\n")
+        elif severity == NOTE:
+            lines.append(f"    NOTE: {message}\n")
+        else:
+            lines.append(f"{path}:{line}: {severity}: {message}\n")
+        if len(lines) >= batch:
+            out.write("".join(lines))
+            lines = []
+    out.write("".join(lines))
+
+def emit_jsonl(records, out, batch=1024):
+    lines = []
+    for record in records:
+        path, line, severity, code = record[:4]
+        lines.append(json.dumps({
+            "path": path,
+            "line": line,
+            "severity": severity,
+            "code": code,
+            "message": format_message(record),
+        }) + "\n")
+        if len(lines) >= batch:
+            out.write("".join(lines))
+            lines = []
+    out.write("".join(lines))
+
+def emit_sarif(records, out, tool="cfglint"):
+    # A SARIF 2.1.0 log with one run. Notes become results of level note.
+    rules = {}
+    results = []
+    for record in records:
+        path, line, severity, code = record[:4]
+        rules.setdefault(code, {"id": code})
+        location = {"artifactLocation": {"uri": path}}
+        if line > 0:
+            location["region"] = {"startLine": line}
+        results.append({
+            "ruleId": code,
+            "level": severity,
+            "message": {"text": format_message(record)},
+            "locations": [{"physicalLocation": location}],
+        })
+    log = {
+        "version": "2.1.0",
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "runs": [{
+            "tool": {"driver": {"name": tool,
+                                "rules": list(rules.values())}},
+            "results": results,
+        }],
+    }
+    json.dump(log, out, indent=1)
+    out.write("\n")
+
+# the emitters that can be called once per file as results come in
+streaming = {"text", "jsonl"}
+
+emitters = {
+    "text": emit_text,
+    "jsonl": emit_jsonl,
+    "sarif": emit_sarif,
+}
@@ -0,0 +1,546 @@
+# vim:ts=4:et
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+import os
+
+from cfgnode import *
+from script import Script, ByteScript
+
+class SpanConfigNode(ConfigNode):
+    # A ConfigNode that knows where its entries are in the source:
+    #   value_spans[i]  (start, value start, value end) for values[i]: the
+    #                   first byte of the key and the bytes of the value
+    #   node_spans[i]   (start, end) for nodes[i]: the first byte of the
+    #                   key to just past the closing }
+    #   body            (start, end): just past the node's { and its }
+    # Entries added through a ConfigEditor have ("added", edit) spans.
+    __slots__ = ("value_spans", "node_spans", "body")
+    def __init__(self):
+        ConfigNode.__init__(self)
+        self.value_spans = []
+        self.node_spans = []
+        self.body = None
+
+def parse_spans(text, filename="", cls=SpanConfigNode):
+    # ConfigNode.ParseTree over the latin-1 bytes text, recording the byte
+    # span of every value and node as it goes
+    script = ByteScript(filename, text, "{}=", False)
+    script.error = cfg_error.__get__(script, Script)
+    getToken = script.getToken
+    root = node = cls()
+    root.body = (0, len(text))
+    stack = []
+    while True:
+        token = getToken(True)
+        if token == None:
+            break
+        if token == "\xef\xbb\xbf":
+            continue
+        if token == '}':
+            if not stack:
+                cfg_error(script, "unexpected }")
+            node.body = (node.body[0], script.pos - 1)
+            node = stack.pop()
+            node.node_spans[-1] = (node.node_spans[-1][0], script.pos)
+            continue
+        if token == '{' or token == '=':
+            cfg_error(script, "unexpected " + token)
+        key = token
+        token_end = script.pos
+        token_start = token_end - len(token)
+        multi = False
+        while True:
+            token = getToken(True)
+            if token == None:
+                break
+            if token == '=':
+                line = script.line
+                value = ''
+                value_start = value_end = script.pos
+                if script.tokenAvailable(False):
+                    value_start = script.pos
+                    script.getLine()
+                    value = script.token.strip()
+                    value_end = value_start + len(value)
+                if multi:
+                    key = script.getText(token_start, token_end)
+                node.values.append((key, value, line))
+                node.value_spans.append((token_start, value_start, value_end))
+                break
+            elif token == '{':
+                if multi:
+                    key = script.getText(token_start, token_end)
+                new_node = cls()
+                new_node.body = (script.pos, None)
+                node.nodes.append((key, new_node, script.line))
+                node.node_spans.append((token_start, None))
+                stack.append(node)
+                node = new_node
+                break
+            token_end = script.pos
+            multi = True
+    if stack:
+        cfg_error(script, "unexpected end of file")
+    return root
+
+def line_start(text, pos):
+    # the start of pos's line if only blanks come before pos on it
+    i = pos
+    while i > 0 and text[i - 1] in b" \t":
+        i -= 1
+    if i == 0 or text[i - 1] == 10:
+        return i
+    return pos
+
+def line_end(text, pos):
+    # just past the end of pos's line if only blanks or a comment follow
+    # pos on it
+    i = pos
+    while i < len(text) and text[i] in b" \t\r":
+        i += 1
+    if text[i:i + 2] == b"//":
+        i = text.find(b"\n", i)
+        if i < 0:
+            return len(text)
+    if i == len(text):
+        return i
+    if text[i] == 10:
+        return i + 1
+    return pos
+
+def format_node(key, node, indent, newline):
+    # node as KSP writes it: key and braces on lines of their own and tab
+    # indentation
+    lines = ["%s%s%s%s{%s" % (indent, key, newline, indent, newline)]
+    inner = indent + "\t"
+    for val in node.values:
+        lines.append("%s%s = %s%s" % (inner, val[0], val[1], newline))
+    for n in node.nodes:
+        lines.append(format_node(n[0], n[1], inner, newline))
+    lines.append("%s}%s" % (indent, newline))
+    return "".join(lines)
+
+class ConfigEditor:
+    # Changes to a config file kept as splices of its original bytes, so
+    # everything not edited is written back byte for byte. The tree in
+    # root follows the edits, but spans always refer to the original text.
+    # Edits may not overlap; setting a value again replaces the edit that
+    # set it before, and removing an entry drops the edits inside it. A
+    # node added with AddNode has no spans: edits to it (or anything in
+    # it) format it again.
+    def __init__(self, text, path=None):
+        self.text = text
+        self.path = path
+        self.root = parse_spans(text, path or "")
+        self.edits = []     # (start, end, sequence, bytes) or None
+        self.value_edits = {}   # value span: its edit in edits
+        self.added = {}     # id(node): (node, edit) for nodes in added ones
+        self.added_nodes = {}   # edit: (key, node, indent, prefix)
+        nl = text.find(b"\n")
+        self.newline = "\r\n" if nl > 0 and text[nl - 1] == 13 else "\n"
+        self.stat = None
+        if path:
+            st = os.stat(path)
+            self.stat = st.st_size, st.st_mtime_ns
+    @classmethod
+    def loadfile(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read(), path)
+    def splice(self, start, end, text):
+        # replace the original bytes start:end with text
+        seq = len(self.edits)
+        self.edits.append((start, end, seq, text.encode("latin-1")))
+        return seq
+    def drop_edits(self, start, end):
+        # forget the edits to the original bytes start:end, about to be
+        # removed
+        for e in self.edits:
+            if e != None and start <= e[0] < end and e[1] <= end:
+                self.edits[e[2]] = None
+        for span, seq in list(self.value_edits.items()):
+            if self.edits[seq] == None:
+                del self.value_edits[span]
+    def added_edit(self, node):
+        # the edit that added node (or the node it is in), if AddNode did
+        entry = self.added.get(id(node))
+        if entry != None and entry[0] is node:
+            return entry[1]
+        return None
+    def register(self, node, seq):
+        self.added[id(node)] = node, seq
+        for n in node.nodes:
+            self.register(n[1], seq)
+    def reformat(self, seq):
+        # format the node added by edit seq again after a change to it
+        edit = self.edits[seq]
+        if edit == None:
+            return
+        key, node, indent, prefix = self.added_nodes[seq]
+        text = prefix + format_node(key, node, indent, self.newline)
+        self.edits[seq] = edit[:3] + (text.encode("latin-1"),)
+    def insert_point(self, node):
+        # where to add an entry to node, and the indent and line prefix
+        # for it
+        end = node.body[1]
+        if node is self.root:
+            if end and self.text[end - 1] != 10:
+                return end, "", self.newline
+            return end, "", ""
+        start = line_start(self.text, end)
+        indent = self.text[start:end].decode("latin-1") + "\t"
+        if start == end and end and self.text[end - 1] != 10:
+            # the } shares its line with something else
+            return end, "\t", self.newline
+        return start, indent, ""
+    def GetValue(self, node, key):
+        return node.GetValue(key)
+    def SetValue(self, node, key, value):
+        added = self.added_edit(node)
+        if added != None:
+            node.SetValue(key, value)
+            self.reformat(added)
+            return
+        for i, val in enumerate(node.values):
+            if val[0] == key:
+                break
+        else:
+            self.AddValue(node, key, value)
+            return
+        span = node.value_spans[i]
+        node.values[i] = (key, value, val[2])
+        if span[0] == "added":
+            start, end, seq, text = self.edits[span[1]]
+            indent = text.decode("latin-1")
+            indent = indent[:len(indent) - len(indent.lstrip("\r\n\t "))]
+            line = "%s%s = %s%s" % (indent, key, value, self.newline)
+            self.edits[seq] = (start, end, seq, line.encode("latin-1"))
+            return
+        start, vstart, vend = span
+        if vstart == vend and value:
+            value = " " + value
+        seq = self.value_edits.get((vstart, vend))
+        if seq != None:
+            self.edits[seq] = (vstart, vend, seq, value.encode("latin-1"))
+        else:
+            self.value_edits[vstart, vend] = self.splice(vstart, vend, value)
+    def AddValue(self, node, key, value):
+        added = self.added_edit(node)
+        if added != None:
+            node.AddValue(key, value)
+            self.reformat(added)
+            return
+        pos, indent, prefix = self.insert_point(node)
+        line = "%s%s%s = %s%s" % (prefix, indent, key, value, self.newline)
+        seq = self.splice(pos, pos, line)
+        node.values.append((key, value, 0))
+        node.value_spans.append(("added", seq))
+        node.value_index = None
+    def AddNode(self, node, key, child, text=None):
+        # add child to node; text is the source of the new node (eg from
+        # NodeText), otherwise it is formatted from child (as it also is
+        # once child or the node it is added to is edited)
+        added = self.added_edit(node)
+        if added != None:
+            node.AddNode(key, child)
+            self.register(child, added)
+            self.reformat(added)
+            return
+        pos, indent, prefix = self.insert_point(node)
+        if text == None:
+            text = format_node(key, child, indent, self.newline)
+        seq = self.splice(pos, pos, prefix + text)
+        self.added_nodes[seq] = key, child, indent, prefix
+        self.register(child, seq)
+        node.nodes.append((key, child, 0))
+        node.node_spans.append(("added", seq))
+        node.node_index = None
+    def RemoveValue(self, node, index):
+        added = self.added_edit(node)
+        if added != None:
+            del node.values[index]
+            node.value_index = None
+            self.reformat(added)
+            return
+        span = node.value_spans[index]
+        if span[0] == "added":
+            self.edits[span[1]] = None
+        else:
+            start = line_start(self.text, span[0])
+            end = line_end(self.text, span[2])
+            self.drop_edits(start, end)
+            self.splice(start, end, "")
+        del node.values[index]
+        del node.value_spans[index]
+        node.value_index = None
+    def RemoveNode(self, node, index):
+        added = self.added_edit(node)
+        if added != None:
+            del node.nodes[index]
+            node.node_index = None
+            self.reformat(added)
+            return
+        span = node.node_spans[index]
+        if span[0] == "added":
+            self.edits[span[1]] = None
+        else:
+            start = line_start(self.text, span[0])
+            end = line_end(self.text, span[1])
+            self.drop_edits(start, end)
+            self.splice(start, end, "")
+        del node.nodes[index]
+        del node.node_spans[index]
+        node.node_index = None
+    def NodeText(self, node, index):
+        # the source of nodes[index] of node, whole lines where it has
+        # them to itself
+        start, end = node.node_spans[index]
+        start = line_start(self.text, start)
+        end = line_end(self.text, end)
+        return self.text[start:end].decode("latin-1")
+    def sorted_edits(self):
+        edits = sorted([e for e in self.edits if e != None])
+        for i in range(1, len(edits)):
+            if edits[i][0] < edits[i - 1][1]:
+                raise ValueError("overlapping edits at %d" % edits[i][0])
+        return edits
+    def chunks(self):
+        # the new text as a sequence of bytes objects
+        pos = 0
+        for start, end, seq, text in self.sorted_edits():
+            yield self.text[pos:start]
+            yield text
+            pos = end
+        yield self.text[pos:]
+    def GetText(self):
+        return b"".join(self.chunks())
+    def write(self, path=None):
+        # Write the edited text to path (the file it was loaded from by
+        # default). If the file has not changed since it was loaded and no
+        # edit changes the length of what it replaces, only the edited
+        # bytes are written.
+        path = path or self.path
+        edits = self.sorted_edits()
+        if (path == self.path and self.stat
+            and all(e[1] - e[0] == len(e[3]) for e in edits)):
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) == self.stat:
+                with open(path, "r+b") as f:
+                    for start, end, seq, text in edits:
+                        f.seek(start)
+                        f.write(text)
+                return
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "wb") as f:
+            for chunk in self.chunks():
+                f.write(chunk)
+        os.replace(tmp, path)
+
+class SourceConfigNode(SpanConfigNode):
+    # A SpanConfigNode that keeps the text it was parsed from, so it can be
+    # edited with the ordinary ConfigNode methods and written back with
+    # GetSource. Whatever has not changed (comments, blank lines, spacing
+    # and line endings included) is copied from the source, a whole subtree
+    # at a time where nothing in it changed; only changed values and new
+    # entries are formatted.
+    #   source          the text (bytes) the node was parsed from
+    #   source_values   values and nodes as parsed, parallel to
+    #   source_nodes    value_spans and node_spans
+    # Values are matched to the parsed ones by their place among those of
+    # the same key. Removing an entry also removes the comment lines just
+    # before it.
+    __slots__ = ("source", "source_values", "source_nodes")
+    def __init__(self):
+        SpanConfigNode.__init__(self)
+        self.source = None
+        self.source_values = None
+        self.source_nodes = None
+    @classmethod
+    def load(cls, text, filename=""):
+        if type(text) == str:
+            text = text.encode("latin-1")
+        root = parse_spans(text, filename, cls)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node.source = text
+            node.source_values = node.values[:]
+            node.source_nodes = node.nodes[:]
+            stack.extend([n[1] for n in node.nodes])
+        return root
+    @classmethod
+    def loadfile(cls, path):
+        with open(path, "rb") as f:
+            return cls.load(f.read(), path)
+    def Modified(self):
+        # true if anything in the tree has changed since it was parsed
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node_changed(node):
+                return True
+            stack.extend([n[1] for n in node.nodes])
+        return False
+    def GetSource(self):
+        # the text of the tree as bytes
+        changed = changed_nodes(self)
+        if id(self) not in changed:
+            return self.source
+        nl = self.source.find(b"\n")
+        newline = "\r\n" if nl > 0 and self.source[nl - 1] == 13 else "\n"
+        out = []
+        write_body(self, out, newline, "", changed)
+        return b"".join(out)
+    def WriteSource(self, path):
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "wb") as f:
+            f.write(self.GetSource())
+        os.replace(tmp, path)
+
+def node_changed(node):
+    # true if node's own values or nodes are not those it was parsed with
+    if (node.source == None
+        or len(node.values) != len(node.source_values)
+        or len(node.nodes) != len(node.source_nodes)):
+        return True
+    for a, b in zip(node.values, node.source_values):
+        if a is not b:
+            return True
+    for a, b in zip(node.nodes, node.source_nodes):
+        if a is not b:
+            return True
+    return False
+
+def changed_nodes(root):
+    # the ids of the nodes of the tree that have changed or have changes
+    # below them
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend([n[1] for n in node.nodes])
+    changed = set()
+    for node in reversed(order):    # children before their parents
+        if node_changed(node):
+            changed.add(id(node))
+            continue
+        for n in node.nodes:
+            if id(n[1]) in changed:
+                changed.add(id(node))
+                break
+    return changed
+
+def match_values(node):
+    # source index: current value for the values still in node. The nth
+    # value of a key stands for the nth parsed value of that key, so the
+    # values keep their places and order in the source; values of a key
+    # beyond those parsed are new.
+    slots = {}
+    for i, s in enumerate(node.source_values):
+        if s[0] in slots:
+            slots[s[0]].append(i)
+        else:
+            slots[s[0]] = [i]
+    matched = {}
+    new = []
+    counts = {}
+    for v in node.values:
+        n = counts.get(v[0], 0)
+        counts[v[0]] = n + 1
+        free = slots.get(v[0], ())
+        if n < len(free):
+            matched[free[n]] = v
+        else:
+            new.append(v)
+    return matched, new
+
+def write_body(node, out, newline, indent, changed):
+    # Append to out the text between node's braces (all of it for the
+    # root), copying what is unchanged from the source. Each entry's text
+    # runs from the end of the one before it to the end of its own line.
+    text = node.source
+    start, end = node.body
+    values, new_values = match_values(node)
+    ids = {id(n): i for i, n in enumerate(node.source_nodes)}
+    nodes = {}
+    new_nodes = []
+    for n in node.nodes:
+        i = ids.get(id(n))
+        if i != None:
+            nodes[i] = n
+        else:
+            new_nodes.append(n)
+    entries = sorted([(s[0], 0, i) for i, s in enumerate(node.value_spans)]
+                     + [(s[0], 1, i) for i, s in enumerate(node.node_spans)])
+    # the rest of the line of the { is kept whatever becomes of the first
+    # entry
+    pos = line_end(text, start)
+    out.append(text[start:pos])
+    for entry_start, kind, i in entries:
+        if kind == 0:
+            vstart, vend = node.value_spans[i][1:]
+            entry_end = line_end(text, vend)
+            v = values.get(i)
+            source = node.source_values[i]
+            if v is source or (v != None and v[1] == source[1]):
+                out.append(text[pos:entry_end])
+            elif v != None:
+                value = v[1]
+                if vstart == vend and value:
+                    value = " " + value
+                out.append(text[pos:vstart])
+                out.append(value.encode("latin-1"))
+                out.append(text[vend:entry_end])
+        else:
+            entry_end = line_end(text, node.node_spans[i][1])
+            n = nodes.get(i)
+            if n != None:
+                child = n[1]
+                if id(child) not in changed:
+                    out.append(text[pos:entry_end])
+                else:
+                    body_start, body_end = child.body
+                    out.append(text[pos:body_start])
+                    write_body(child, out, newline, indent + "\t",
+                               changed)
+                    out.append(text[body_end:entry_end])
+        pos = entry_end
+    if new_values or new_nodes:
+        close_indent = None
+        if end < len(text):
+            # indent one more than the closing brace if it has a line of
+            # its own
+            line = line_start(text, end)
+            if line != end or text[end - 1] == 10:
+                indent = text[line:end].decode("latin-1") + "\t"
+            else:
+                close_indent = indent[:-1]
+        if pos and text[pos - 1] != 10:
+            out.append(newline.encode("latin-1"))
+        lines = []
+        for v in new_values:
+            lines.append("%s%s = %s%s" % (indent, v[0], v[1], newline))
+        for n in new_nodes:
+            lines.append(format_node(n[0], n[1], indent, newline))
+        if close_indent != None and pos == end:
+            lines.append(close_indent)
+        out.append("".join(lines).encode("latin-1"))
+    out.append(text[pos:end])
@@ -22,148 +22,143 @@
 import sys
 import os
 import getopt
+import json
+import multiprocessing
+from contextlib import redirect_stdout
+from hashlib import sha1
 
 from cfgnode import *
-from kspdata import recurse_tree, find_resources, resources
-
-shortopts = ''
+from cfgcache import ParseCache
+from cfgdiag import Diagnostics, filter_records, has_errors
+from cfgdiag import emitters, streaming
+from cfgcolumns import convert, below, split_column
+import kspdata
+from kspdata import find_all_resources, find_resources, resources
+from kspdata import get_resource
+
+shortopts = 'j:'
 longopts = [
+    'cache=',
     'gamedata=',
-    'resources='
+    'jobs=',
+    'state=',
+    'resources=',
+    'schema=',
+    'format=',
+    'suppress=',
+    'once=',
 ]
-errors = False
-
-def error(path, line, message):
-    global errors
-    errors = True
-    print(f"{path}:{line}: {message}")
-
-def warning(path, line, message):
-    print(f"{path}:{line}: warning: {message}")
-
-part_required_fields = (
-    ("name", error, "Missing field 'name'"),
-    ("module", error, "Missing field 'module'"),
-    ("TechRequired", error, "Missing field 'TechRequired'"),
-    ("entryCost", error, "Missing field 'entryCost'"),
-    ("cost", error, "Missing field 'cost'"),
-    ("category", error, "Missing field 'category'"),
-    ("title", error, "Missing field 'title'"),
-    ("mass", error, "Missing field 'mass'"),
-
-    ("tags", warning, "Missing field 'tags'"),
-    ("manufacturer", warning, "Missing field 'manufacturer'"),
-    ("description", warning, "Missing field 'description'"),
-    ("rescaleFactor", warning, "rescaleFactor defaults to 1.25"),
-    ("attachRules", warning, "attachRules defaults to not allowing attachment"),
-    ("dragModelType", warning, "dragModelType defaults to 'default' (cube)"),
-    ("maximum_drag", warning, "maximum_drag defaults to 0.1"),
-    ("minimum_drag", warning, "minimum_drag defaults to 0.1"),
-    ("angularDrag", warning, "angularDrag defaults to 2"),
-    ("crashTolerance", warning, "crashTolerance defaults to 9"),
-    ("maxTemp", warning, "maxTemp defaults to 2000 (Kelvin)"),
-    ("heatConductivity", warning, "heatConductivity defaults to 0.12"),
-    ("skinInternalConductionMult", warning, "skinInternalConductionMult defaults to 1"),
-    ("emissiveConstant", warning, "emissiveConstant defaults to 0.4"),
-)
+diagnostics = Diagnostics()
+referenced = set()      # resource names used by the file being linted
+batch = None            # a BatchChecks while linting a batch of files
+serial_batch = 64       # files per batch (and results per wait) with -j 1
+
+def error(path, line, code, message, *args):
+    diagnostics.error(path, line, code, message, *args)
+
+def warning(path, line, code, message, *args):
+    diagnostics.warning(path, line, code, message, *args)
+
+def note(path, line, code, message, *args):
+    diagnostics.note(path, line, code, message, *args)
 
 def check_name(name, value, path, line):
     pass
 
 def discourage_mesh(name, value, path, line):
-    warning(path, line, "the value of 'mesh' is ignored and the first (ascii-sort) .mu file in the directory is used. use MODEL {} instead")
+    warning(path, line, "mesh-ignored", "the value of 'mesh' is ignored and the first (ascii-sort) .mu file in the directory is used. use MODEL {} instead")
 
 def positive_nonzero_float(name, value, path, line):
     try:
         val = float(value)
     except ValueError:
-        error(path, line, f"{name} not a valid float")
+        error(path, line, "invalid-float", "{} not a valid float", name)
     else:
         if val <= 0:
-            warning(path, line, f"{name} should be > 0")
+            warning(path, line, "not-positive", "{} should be > 0", name)
 
 def positive_int(name, value, path, line):
     try:
         val = int(value)
     except ValueError:
-        error(path, line, f"{name} not a valid int")
+        error(path, line, "invalid-int", "{} not a valid int", name)
     else:
         if val < 0:
-            warning(path, line, f"{name} should be >= 0")
+            warning(path, line, "negative", "{} should be >= 0", name)
 
 def positive_float(name, value, path, line):
     try:
         val = float(value)
     except ValueError:
-        error(path, line, f"{name} not a valid float")
+        error(path, line, "invalid-float", "{} not a valid float", name)
     else:
         if val < 0:
-            warning(path, line, f"{name} should be >= 0")
+            warning(path, line, "negative", "{} should be >= 0", name)
 
 def boolean(name, value, path, line):
     if value.upper() not in ['TRUE', 'FALSE']:
-        error(path, line, f"{name} not a valid bool")
+        error(path, line, "invalid-bool", "{} not a valid bool", name)
 
 def vector(name, value, path, line):
     vals = value.split(",")
     if len(vals) != 3:
-        error(path, line, f"{name} must be a vector: 3 comma-separated floats")
+        error(path, line, "invalid-vector", "{} must be a vector: 3 comma-separated floats", name)
     for i, v in enumerate(vals):
         try:
             val = float(v)
         except ValueError:
-            error(path, line, f"{name}[i] not a valid float")
+            error(path, line, "invalid-float", "{}[i] not a valid float", name)
 
 def color(name, value, path, line):
     if value[0] == '#':
         if len(value) != 7:
-            error(path, line, f"{name} must be # followed by 6 hex digits")
+            error(path, line, "invalid-color", "{} must be # followed by 6 hex digits", name)
         try:
             val = int('0x'+value[1:])
         except ValueError:
-            error(path, line, f"{name} must be # followed by 6 hex digits")
+            error(path, line, "invalid-color", "{} must be # followed by 6 hex digits", name)
     else:
         vals = value.split(",")
         if len(vals) != 3:
-            error(path, line, f"{name} must be 3 comma-separated floats")
+            error(path, line, "invalid-color", "{} must be 3 comma-separated floats", name)
         for i, v in enumerate(vals):
             try:
                 val = float(v)
             except ValueError:
-                error(path, line, f"{name}[i] not a valid float")
+                error(path, line, "invalid-float", "{}[i] not a valid float", name)
             if val < 0 or val > 1:
-                error(path, line, f"{name}[i] should be in the range 0 to 1")
+                error(path, line, "color-range", "{}[i] should be in the range 0 to 1", name)
 
 def quaternion(name, value, path, line):
     vals = value.split(",")
     if len(vals) != 4:
-        error(path, line, f"{name} must be a quaternion: 4 comma-separated floats")
+        error(path, line, "invalid-quaternion", "{} must be a quaternion: 4 comma-separated floats", name)
     for i, v in enumerate(vals):
         try:
             val = float(v)
         except ValueError:
-            error(path, line, f"{name}[i] not a valid float")
+            error(path, line, "invalid-float", "{}[i] not a valid float", name)
 
 def check_attachRules(name, value, path, line):
     vals = value.split(",")
     if len(vals) < 5:
-        error(path, line, f"{name} must have at least 5 comma-separated 0 or 1 values")
+        error(path, line, "invalid-attachRules", "{} must have at least 5 comma-separated 0 or 1 values", name)
         return
     if len(vals) > 8:
-        warning(path, line, f"only 8 values are significant for {name}")
+        warning(path, line, "excess-attachRules", "only 8 values are significant for {}", name)
         vals = vals[:8]
     for i, v in enumerate(vals):
         if v  not in ["1", "0"]:
-            warning(path, line, f"{name}[{i}]: {v} not a valid flag (anything but 1 is treated as 0")
+            warning(path, line, "invalid-flag", "{}[{}]: {} not a valid flag (anything but 1 is treated as 0", name, i, v)
 
 def ignored(name, value, path, line):
-    warning(path, line, f"{name} is ignored")
+    warning(path, line, "ignored-field", "{} is ignored", name)
 
 def physics_significance(name, value, path, line):
-    warning(path, line, f"use of PhysicsSignificance is discouraged. use physicalSignificance instead")
-    print("    NOTE: if not -1 (default), parts attached to BG robotics parts are forced full physics with a minimum mass of 6.5kg")
+    warning(path, line, "discouraged-field", "use of PhysicsSignificance is discouraged. use physicalSignificance instead")
+    note(path, line, "discouraged-field", "if not -1 (default), parts attached to BG robotics parts are forced full physics with a minimum mass of 6.5kg")
     if value not in ['-1', '0', '1']:
-        error(path, line, f"{name} must be -1, 0 (full physics) or 1 (physicsless)")
+        error(path, line, "invalid-enum", "{} must be -1, 0 (full physics) or 1 (physicsless)", name)
 
 def enum(enum_values, case_insensitive=False):
     class enum_check:
@@ -175,7 +170,7 @@ def enum(enum_values, case_insensitive=False):
             if self.case_insensitive:
                 val = value.upper()
             if val not in self.values:
-                error(path, line, f"{value} not valid for {name}")
+                error(path, line, "invalid-enum", "{} not valid for {}", value, name)
     e = enum_check(enum_values, case_insensitive)
     return e.check
 
@@ -184,29 +179,29 @@ def check_node(name, value, path, line):
     nodeData = value.split(",")
     if keyData[1] in ["stack", "dock"]:
         if len(keyData) < 3:
-            warning(path, line, f"no id given for {name}")
+            warning(path, line, "node-id", "no id given for {}", name)
         if len(keyData) > 3:
-            warning(path, line, f"excess tags ignored in {name}. should be only 2 _")
+            warning(path, line, "node-tags", "excess tags ignored in {}. should be only 2 _", name)
     elif keyData[1] == "attach":
         if len(keyData) > 2:
-            warning(path, line, f"excess tags ignored in {name}. should be only 1 _")
+            warning(path, line, "node-tags", "excess tags ignored in {}. should be only 1 _", name)
     else:
-        warning(path, line, f"{name} not a known node type in {name}")
+        warning(path, line, "node-type", "{} not a known node type in {}", name, name)
     if len(nodeData) < 6:
-        error(path, line, f"need at least 6 comma-separated floats for a valid node")
+        error(path, line, "invalid-node", "need at least 6 comma-separated floats for a valid node")
         return
     for i in range(6):
         try:
             val = float(nodeData[i])
         except:
-            error(path, line, f"{name}[i] not a valid float")
+            error(path, line, "invalid-float", "{}[i] not a valid float", name)
     if len(nodeData) > 11:
-        warning(path, line, f"excess items in {name} ignored (up to 12 values)")
+        warning(path, line, "node-values", "excess items in {} ignored (up to 12 values)", name)
     for i in range(6, len(nodeData)):
         try:
             val = int(nodeData[i])
         except:
-            error(path, line, f"{name}[i] not a valid int")
+            error(path, line, "invalid-int", "{}[i] not a valid int", name)
 
 def filepath(extensions):
     class path_check:
@@ -216,357 +211,286 @@ def filepath(extensions):
             if "." in value:
                 ext = value[value.rindex("."):]
                 if ext in self.extensions:
-                    error(path, line, f"file extension specified for {name}")
+                    error(path, line, "file-extension", "file extension specified for {}", name)
                 else:
-                    warning(path, line, f". in file names not a good idea")
+                    warning(path, line, "dot-in-filename", ". in file names not a good idea")
             if "\\" in value:
-                error(path, line, f"\\ is not a universally valid directory separator. Use /")
+                error(path, line, "backslash-path", "\\ is not a universally valid directory separator. Use /")
             elif "/" not in value:
-                warning(path, line, "file paths need to be GameData relative")
+                warning(path, line, "relative-path", "file paths need to be GameData relative")
     p = path_check(extensions)
     return p.check
 
+texture_path = filepath((".dds", ".jpeg", ".jpg", ".mbm", ".png", ".tga", ".truecolor"))
+
 def texture_spec(name, value, path, line):
     vals = value.split(",")
     if len(vals) != 2:
-        error(path, line, f"{name} must be two comma-separated strings")
+        error(path, line, "invalid-texture", "{} must be two comma-separated strings", name)
     else:
-        filepath((".dds", ".jpeg", ".jpg", ".mbm", ".png", ".tga", ".truecolor"))(name, vals[1], path, line)
-
-module_enum = {
-    'Part',
-    'CompoundPart',
-}
-
-physicalSignificance_enum = {
-    'FULL',
-    'NONE',
-}
-
-TechRequired_enum = {
-    'Unresearcheable',  #sic
-    'Unresearchable',   #fake
-    'actuators',
-    'advAerodynamics',
-    'advConstruction',
-    'advElectrics',
-    'advExploration',
-    'advFlightControl',
-    'advFuelSystems',
-    'advLanding',
-    'advMetalworks',
-    'advRocketry',
-    'advScienceTech',
-    'advUnmanned',
-    'advancedMotors',
-    'aerodynamicSystems',
-    'aerospaceTech',
-    'automation',
-    'aviation',
-    'basicRocketry',
-    'basicScience',
-    'commandModules',
-    'composites',
-    'electrics',
-    'electronics',
-    'engineering101',
-    'experimentalAerodynamics',
-    'experimentalElectrics',
-    'experimentalMotors',
-    'experimentalScience',
-    'fieldScience',
-    'flightControl',
-    'fuelSystems',
-    'generalConstruction',
-    'generalRocketry',
-    'heavierRocketry',
-    'heavyAerodynamics',
-    'heavyLanding',
-    'heavyRocketry',
-    'highAltitudeFlight',
-    'highPerformanceFuelSystems',
-    'hypersonicFlight',
-    'ionPropulsion',
-    'landing',
-    'largeElectrics',
-    'largeUnmanned',
-    'largeVolumeContainment',
-    'metaMaterials',
-    'miniaturization',
-    'nanolathing',
-    'nuclearPropulsion',
-    'precisionEngineering',
-    'precisionPropulsion',
-    'propulsionSystems',
-    'scienceTech',
-    'spaceExploration',
-    'specializedConstruction',
-    'specializedControl',
-    'specializedElectrics',
-    'stability',
-    'start',
-    'supersonicFlight',
-    'survivability',
-    'unmannedTech',
-    'veryHeavyRocketry',
-}
-
-category_enum = {
-    'Command',
-    'Propulsion',
-    'FuelTank',
-    'Engine',
-    'Aero',
-    'Electrical',
-    'Structural',
-    'Utility',
-    'Wheel',
-    'Ground',
-    'Thermal',
-    'Coupling',
-    'Payload',
-    'Communication',
-    'Science',
-    'none',
-    'Robotics', # BG only?
-    'Cargo', # BG only?
-    'Control',
-    'Pods',
-}
-
-dragModelType_enum = {
-    'SPHERICAL',
-    'CYLINDRICAL',
-    'CONIC',
-    'OVERRIDE',
-    'NONE',
-    'CUBE',
-    'DEFAULT',
-}
-
-vesselType_enum = {
-    'Debris',
-    'SpaceObject',
-    'Unknown',
-    'Probe',
-    'Relay',
-    'Rover',
-    'Lander',
-    'Ship',
-    'Plane',
-    'Station',
-    'Base',
-    'EVA',
-    'Flag',
-    'DeployedScienceController',
-    'DeployedSciencePart',
-}
-
-part_valid_fields = {
-    'name': check_name,
-    'module': enum(module_enum),
-    'author': None,
-    'mesh': discourage_mesh,
-    'scale': positive_nonzero_float,
-    'rescaleFactor': positive_nonzero_float,
-    'attachRules': check_attachRules,
-    'TechRequired': enum(TechRequired_enum),
-    'entryCost': positive_int,
-    'cost': positive_float,
-    'category': enum(category_enum),
-    'subcategory': ignored,
-    'title': None,
-    'manufacturer': None,
-    'description': None,
-    'tags': None,
-    'mass': positive_nonzero_float,
-    'dragModelType': enum(dragModelType_enum, True),
-    'maximum_drag': positive_nonzero_float,
-    'minimum_drag': positive_nonzero_float,
-    'angularDrag': positive_nonzero_float,
-    'crashTolerance': positive_nonzero_float,
-    'maxTemp': positive_nonzero_float,
-    'skinMaxTemp': positive_nonzero_float,
-    'heatConductivity': positive_nonzero_float,
-    'heatConvectiveConstant': positive_nonzero_float,
-    'skinInternalConductionMult': positive_nonzero_float,
-    'emissiveConstant': positive_nonzero_float,
-    'thermalMassModifier': positive_nonzero_float,
-    'CrewCapacity': positive_int,
-    'bulkheadProfiles': None, #FIXME
-    'stackSymmetry': positive_int,
-    'breakingTorque': positive_nonzero_float,
-    'breakingForce': positive_nonzero_float,
-    'fuelCrossFeed': boolean,
-    'inverseStageCarryover': boolean,
-    'explosionPotential': positive_float,
-    'vesselType': enum(vesselType_enum),
-    'stageOffset': positive_int,
-    'childStageOffset': positive_int,
-    'CoMOffset': vector,
-    'CoLOffset': vector,
-    'CoPOffset': vector,
-    'CenterOfDisplacement': vector,
-    'CenterOfBuoyancy': vector,
-    'skinMassPerArea': positive_float,
-    'stagingIcon': None, #FIXME
-    'bodyLiftOnlyAttachName': None, #FIXME
-    'bodyLiftOnlyUnattachedLift': boolean,
-    'bodyLiftOnlyUnattachedLiftActual': boolean,
-    'TechHidden': boolean,
-    'buoyancyUseSine': boolean,
-    'buoyancy': positive_float,
-    'PhysicsSignificance':physics_significance,
-    'physicalSignificance':enum(physicalSignificance_enum),
-    'mirrorRefAxis': vector,
-    'radiatorMax': positive_nonzero_float,
-    'boundsCentroidOffset': vector,
-    'partRendererBoundsIgnore': None, #FIXME
-    'bodyLiftMultiplier': positive_nonzero_float,
-    'buoyancyUseCubeNamed': None, #FIXME
-    'initRotation': quaternion,
-    'noAutoEVAMulti': boolean,
-    'noAutoEVAAny': boolean,
-    'iconCenter': ignored,
-    'boundsMultiplier': positive_nonzero_float,
-    'ActivatesEvenIfDisconnected': boolean,
-    'radiatorHeadroom': positive_nonzero_float,
-    'skipColliderIgnores': boolean,
-    'mapActionsToSymmetryParts': boolean,
-    'resourcePriorityUseParentInverseStage': boolean,
-}
-
-compoundpart_valid_fields = {
-    'maxLength': positive_nonzero_float,
-}
+        texture_path(name, vals[1], path, line)
 
 def check_resource(name, value, path, line):
+    referenced.add(value)
     if value not in resources:
-        error(path, line, f"'{value}' not a known resource")
-
-resource_required_fields = (
-    ('name', error, "Missing field 'name'"),
-    ('amount', error, "Missing field 'amount'"),
-    ('maxAmount', error, "Missing field 'maxAmount'"),
-)
-
-resource_valid_fields = {
-    'name': check_resource,
-    'amount': positive_float,
-    'maxAmount': positive_float,
-}
-
-resdef_required_fields = (
-    ('name', error, "Missing field 'name'"),
-    ('displayName', warning, "'displayName' defaults to resource name"),
-    ('abbreviation', warning, "'abbreviation' defaults to displayName[;2]"),
-    ('density', warning, "'density' defaults to 1"),
-    ('volume', warning, "'volume' defaults to 5"),
-    ('unitCost', warning, "'unitCost' defaults to 0"),
-    ('hsp', warning, "'hsp' defaults to 0"),
-    ('isTweakable', warning, "'isTweakable' defaults to true"),
-    ('isVisible', warning, "'isVisible' defaults to true"),
-    ('flowMode', warning, "'flowMode' defaults to NO_FLOW"),
-    ('transfer', warning, "'transfer' defaults to NONE"),
-    ('color', warning, "'color' defaults to 1,1,1 (white)"),
-)
-
-flowMode_enum = {
-    'NO_FLOW',
-    'ALL_VESSEL',
-    'STAGE_PRIORITY_FLOW',
-    'STACK_PRIORITY_SEARCH',
-    'ALL_VESSEL_BALANCE',
-    'STAGE_PRIORITY_FLOW_BALANCE',
-    'STAGE_STACK_FLOW',
-    'STAGE_STACK_FLOW_BALANCE',
-    'NULL',
-}
-
-transfer_enum = {
-    'NONE',
-    'DIRECT',
-    'PUMP',
-}
-
-resdef_valid_fields = {
-    'name': None,
-    'displayName': None,
-    'abbreviation': None,
-    'density': positive_float,
-    'volume': positive_float,
-    'unitCost': positive_float,
-    'hsp': positive_float,
-    'isTweakable': boolean,
-    'isVisible': boolean,
-    'isDrainable': boolean,
-    'flowMode': enum(flowMode_enum),
-    'transfer': enum(transfer_enum),
+        error(path, line, "unknown-resource", "'{}' not a known resource", value)
+
+checks = {
+    'check_name': check_name,
+    'discourage_mesh': discourage_mesh,
+    'positive_nonzero_float': positive_nonzero_float,
+    'positive_int': positive_int,
+    'positive_float': positive_float,
+    'boolean': boolean,
+    'vector': vector,
     'color': color,
+    'quaternion': quaternion,
+    'check_attachRules': check_attachRules,
+    'ignored': ignored,
+    'physics_significance': physics_significance,
+    'check_node': check_node,
+    'texture_spec': texture_spec,
+    'check_resource': check_resource,
 }
 
-resdrain_required_fields = (
-    ('isDrainable', warning, "'isDrainable' defaults to true"),
-    ('showDrainFX', warning, "'showDrainFX' defaults to true"),
-    ('drainFXPriority', warning, "'drainFXPriority' defaults to 5"),
-    ('drainForceISP', warning, "'drainFXPriority' defaults to 50"),
-    ('drainFXDefinition ', warning, "'drainFXDefinition ' defaults to gasDraining"),
-)
-
-resdrain_valid_fields = {
-    'isDrainable': boolean,
-    'showDrainFX': boolean,
-    'drainFXPriority': positive_int,
-    'drainForceISP': positive_nonzero_float,
-    'drainFXDefinition': None,
+# checks taking arguments: "enum <name>" and "filepath <extensions>"
+check_factories = {'enum', 'filepath'}
+
+report_levels = {
+    'error': error,
+    'warning': warning,
 }
 
-model_required_fields = (
-    ('model', error, "Missing field 'model'"),
-)
-
-model_valid_fields = {
-    'model': filepath((".mu", ".dae")),
-    'parent': None,
-    'name': None,
-    'scale': vector,
-    'position': vector,
-    'rotation': vector, #ick, euler angles
-    'iconHidden': boolean,
-    'texture': texture_spec,
+schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "cfglint.cfg")
+schema_format = 1       # bump when compile_schemas' output changes
+schema_tables = None    # compile_schemas' output for the loaded schemas
+node_schemas = {}       # node name: Schema
+module_schemas = {}     # MODULE name: Schema
+
+class Schema:
+    # The required and valid fields of one node type, compiled once. The
+    # required fields are checked against a single pass over the node's
+    # values, and fields not in valid_fields are looked up by the prefix
+    # before their first _ in special_fields (eg node_ for PART).
+    def __init__(self, nodename, required_fields, valid_fields,
+                 special_fields={}, dups_ok=(), allow_unknown=False):
+        self.nodename = nodename
+        self.required_fields = required_fields
+        self.valid_fields = valid_fields
+        self.special_fields = special_fields
+        self.dups_ok = frozenset(dups_ok)
+        self.allow_unknown = allow_unknown
+    def check(self, path, line, node):
+        values = node.values
+        present = {v[0] for v in values}
+        for name, report, message in self.required_fields:
+            if name not in present:
+                report(path, line, "missing-field", message)
+        valid_fields = self.valid_fields
+        special_fields = self.special_fields
+        dups_ok = self.dups_ok
+        seen_fields = {}
+        for name, value, line in values:
+            if name not in dups_ok:
+                if name in seen_fields:
+                    warning(path, line, "duplicate-field", "{} dups {} on line {}", name, name, seen_fields[name])
+                else:
+                    seen_fields[name] = line
+            if name in valid_fields:
+                check = valid_fields[name]
+            else:
+                prefix = name[:name.find("_")]
+                if "_" not in name or prefix not in special_fields:
+                    if not self.allow_unknown:
+                        warning(path, line, "unknown-field", "{} not a known {} field", name, self.nodename)
+                    continue
+                check = special_fields[prefix]
+            if check:
+                if batch and check in column_checks:
+                    batch.defer(check, name, value, path, line)
+                else:
+                    check(name, value, path, line)
+
+# the checks BatchChecks can run on a column of values: the type and
+# whether 0 is out of range, or for vectors the number of floats
+column_checks = {
+    positive_nonzero_float: (float, True),
+    positive_float: (float, False),
+    positive_int: (int, False),
+    vector: ('vector', 3),
+    quaternion: ('vector', 4),
 }
 
-def check_fields(path, line, node, nodename, required_fields, valid_fields, check_special=None, dups_ok = set()):
-    seen_fields = {}
-    for req in required_fields:
-        if not node.HasValue(req[0]):
-            req[1](path, line, req[2])
-    for name, value, line in node.values:
-        if name not in dups_ok:
-            if name in seen_fields:
-                warning(path, line, f"{name} dups {name} on line {seen_fields[name]}")
+class BatchChecks:
+    # The column_checks deferred by Schema.check while linting a batch of
+    # files: the values for each check are collected into one column and
+    # converted and range checked in bulk by flush. Only the values that
+    # fail are run through the check itself, and their findings inserted
+    # into their file's records where they would have been reported.
+    def __init__(self):
+        self.columns = {check: [] for check in column_checks}
+        self.count = 0
+    def defer(self, check, name, value, path, line):
+        records = diagnostics.records
+        self.columns[check].append((records, len(records), self.count,
+                                    name, value, path, line))
+        self.count += 1
+    def flush(self):
+        global diagnostics
+        saved = diagnostics
+        inserts = {}
+        for check, entries in self.columns.items():
+            values = [e[4] for e in entries]
+            kind, arg = column_checks[check]
+            if kind == 'vector':
+                parts, owners, counts = split_column(values)
+                converted, bad = convert(parts, float)
+                failed = {owners[i] for i in bad}
+                failed.update(i for i, c in enumerate(counts) if c != arg)
+            else:
+                converted, bad = convert(values, kind)
+                failed = set(bad)
+                failed.update(below(converted, 0, arg))
+            for i in failed:
+                records, pos, seq, name, value, path, line = entries[i]
+                diagnostics = Diagnostics()
+                check(name, value, path, line)
+                if id(records) not in inserts:
+                    inserts[id(records)] = records, []
+                inserts[id(records)][1].append((pos, seq,
+                                                diagnostics.records))
+            entries.clear()
+        diagnostics = saved
+        for records, found in inserts.values():
+            found.sort()
+            merged = []
+            start = 0
+            for pos, seq, new in found:
+                merged.extend(records[start:pos])
+                merged.extend(new)
+                start = pos
+            merged.extend(records[start:])
+            records[:] = merged
+
+def compile_field(line, spec, enums):
+    # check name and arguments from a FIELDS or PREFIXES value, or None
+    if not spec:
+        return None
+    spec = spec.split()
+    name, args = spec[0], tuple(spec[1:])
+    if name in check_factories:
+        if not args:
+            raise ConfigNodeError("", line, f"{name} needs arguments")
+        if name == 'enum' and args[0] not in enums:
+            raise ConfigNodeError("", line, f"unknown enum {args[0]}")
+    elif name not in checks or args:
+        raise ConfigNodeError("", line, f"unknown check {' '.join(spec)}")
+    return name, args
+
+def compile_schemas(text):
+    # Reduce a schema file to plain tables that can be pickled: the enums
+    # as name: (ignore_case, values), and per SCHEMA its node, name,
+    # required fields, field and prefix checks, dupsOk and allowUnknown.
+    cfg = ConfigNode.load(text)
+    if not cfg:
+        return {"enums": {}, "schemas": []}
+    enums = {}
+    for name, node, line in cfg.nodes:
+        if name == 'ENUM':
+            if not node.HasValue('name'):
+                raise ConfigNodeError("", line, "ENUM without a name")
+            ignore_case = node.GetValue('ignoreCase') == 'true'
+            enums[node.GetValue('name')] = (ignore_case,
+                                            frozenset(node.GetValues('value')))
+    schemas = []
+    for name, node, line in cfg.nodes:
+        if name == 'ENUM':
+            continue
+        if name != 'SCHEMA':
+            raise ConfigNodeError("", line, f"unknown node {name}")
+        if not node.HasValue('name'):
+            raise ConfigNodeError("", line, "SCHEMA without a name")
+        required = []
+        fields = {}
+        prefixes = {}
+        for n, block, l in node.nodes:
+            if n == 'REQUIRED':
+                for field, spec, l in block.values:
+                    level, sep, message = spec.partition(" ")
+                    if level not in report_levels:
+                        raise ConfigNodeError("", l,
+                                              f"unknown level {level}")
+                    message = message.strip() or f"Missing field '{field}'"
+                    required.append((field, level, message))
+            elif n in ('FIELDS', 'PREFIXES'):
+                table = fields if n == 'FIELDS' else prefixes
+                for field, spec, l in block.values:
+                    table[field] = compile_field(l, spec, enums)
             else:
-                seen_fields[name] = line
-        if name in valid_fields:
-            if valid_fields[name]:
-                valid_fields[name](name, value, path, line)
+                raise ConfigNodeError("", l, f"unknown node {n}")
+        schemas.append((node.GetValue('node') or node.GetValue('name'),
+                        node.GetValue('name'), tuple(required), fields,
+                        prefixes, tuple(node.GetValues('dupsOk')),
+                        node.GetValue('allowUnknown') == 'true'))
+    return {"enums": enums, "schemas": schemas}
+
+def bind_schemas(tables):
+    # build the Schema objects for compile_schemas' tables
+    global schema_tables
+    schema_tables = tables
+    enums = tables["enums"]
+    bound = {}
+    def bind(spec):
+        if spec == None:
+            return None
+        name, args = spec
+        if name == 'enum':
+            if args not in bound:
+                ignore_case, values = enums[args[0]]
+                bound[args] = enum(values, ignore_case)
+            return bound[args]
+        if name == 'filepath':
+            if args not in bound:
+                bound[args] = filepath(args)
+            return bound[args]
+        return checks[name]
+    node_schemas.clear()
+    module_schemas.clear()
+    for (node, name, required, fields, prefixes, dups_ok,
+         allow_unknown) in tables["schemas"]:
+        required = tuple((field, report_levels[level], message)
+                         for field, level, message in required)
+        fields = {field: bind(spec) for field, spec in fields.items()}
+        prefixes = {field: bind(spec) for field, spec in prefixes.items()}
+        schema = Schema(name, required, fields, prefixes, dups_ok,
+                        allow_unknown)
+        if node == 'MODULE':
+            module_schemas[name] = schema
         else:
-            if not check_special or not check_special(name, value, path, line):
-                warning(path, line, f"{name} not a known {nodename} field")
+            node_schemas[name] = schema
+
+def load_schemas(path=None):
+    # With --cache the compiled tables are kept in the parse cache
+    # alongside parse trees, so only a changed schema file is compiled.
+    global schema_path
+    if path:
+        schema_path = path
+    cache = kspdata.parse_cache
+    if cache:
+        kind = "cfglint-schema-%d" % schema_format
+        bind_schemas(cache.load(schema_path, compile_schemas, kind))
+    else:
+        with open(schema_path, "rb") as f:
+            bind_schemas(compile_schemas(f.read().decode("latin-1")))
 
 def parse_resource(path, line, resnode):
-    check_fields(path, line, resnode, 'RESOURCE', resource_required_fields, resource_valid_fields)
+    node_schemas['RESOURCE'].check(path, line, resnode)
     rescost = 0
     if resnode.HasValue("name"):
         name = resnode.GetValue("name")
         if name in resources:
-            rescost = resources[name].GetValue("unitCost")
-            try:
-                rescost = float(rescost)
-            except ValueError:
-                rescost = 0
-            except TypeError:
-                rescost = 0
+            rescost = get_resource(name).unitCost
     if resnode.HasValue("amount") and resnode.HasValue("maxAmount"):
         try:
             amount = float(resnode.GetValue("amount"))
@@ -575,32 +499,28 @@ def parse_resource(path, line, resnode):
             rescost = 0
         else:
             if amount > maxAmount:
-                warning(path, line, f"amount {amount} > maxAmount {maxAmount}")
+                warning(path, line, "excess-amount", "amount {} > maxAmount {}", amount, maxAmount)
             rescost *= amount
     return rescost
 
 def parse_model(path, line, mdlnode):
-    check_fields(path, line, mdlnode, 'MODEL', model_required_fields, model_valid_fields, dups_ok = {'texture'})
-
-def part_check_special(name, value, path, line):
-    if name[:5] == "node_":
-        check_node(name, value, path, line)
-    elif name[:6] == "sound_":
-        pass
-    elif name[:3] == "fx_":
-        pass
-    else:
-        return False
-    return True
+    node_schemas['MODEL'].check(path, line, mdlnode)
+
+def parse_module(path, line, modnode):
+    name = modnode.GetValue("name")
+    if name in module_schemas:
+        module_schemas[name].check(path, line, modnode)
 
 def parse_part(path, line, partnode):
-    check_fields(path, line, partnode, 'PART', part_required_fields, part_valid_fields, part_check_special)
+    node_schemas['PART'].check(path, line, partnode)
     resource_cost = 0.0
     for name, node, line in partnode.nodes:
         if name == 'RESOURCE':
             resource_cost += parse_resource(path, line, node)
         if name == 'MODEL':
             parse_model(path, line, node)
+        if name == 'MODULE':
+            parse_module(path, line, node)
     if partnode.HasValue("cost"):
         try:
             cost = float(partnode.GetValue("cost"))
@@ -608,13 +528,13 @@ def parse_part(path, line, partnode):
             pass
         else:
             if cost < resource_cost:
-                warning(path, line, f"part cost {cost} is not greater than resouce cost {resource_cost} (:skwod:)")
+                warning(path, line, "part-cost", "part cost {} is not greater than resouce cost {} (:skwod:)", cost, resource_cost)
 
 def parse_resource_drain_definition(path, line, resdrainnode):
-    check_fields(path, line, resdrainnode, 'RESOURCE_DRAIN_DEFINITION', resdrain_required_fields, resdrain_valid_fields)
+    node_schemas['RESOURCE_DRAIN_DEFINITION'].check(path, line, resdrainnode)
 
 def parse_resource_definition(path, line, resdefnode):
-    check_fields(path, line, resdefnode, 'RESOURCE_DEFINITION', resdef_required_fields, resdef_valid_fields)
+    node_schemas['RESOURCE_DEFINITION'].check(path, line, resdefnode)
     for name, node, line in resdefnode.nodes:
         if name == 'RESOURCE_DRAIN_DEFINITION':
             parse_resource_drain_definition(path, line, node)
@@ -624,22 +544,201 @@ parsers = {
     'RESOURCE_DEFINITION': parse_resource_definition,
 }
 
-options, cfgfiles = getopt.getopt(sys.argv[1:], shortopts, longopts)
-for opt, arg in options:
-    if opt == "--gamedata":
-        recurse_tree(os.path.expanduser(arg), find_resources)
-    elif opt == "--resources":
-        find_resources(os.path.expanduser(arg))
-
-for path in cfgfiles:
+def lint_file(path):
+    if schema_tables == None:
+        load_schemas()
     try:
-        cfg = ConfigNode.loadfile(os.path.expanduser(path))
+        cfg = ConfigNode.loadfile(os.path.expanduser(path),
+                                  cache=kspdata.parse_cache)
     except ConfigNodeError as e:
-        print(path + e.message)
+        error(path, e.line, "parse-error", "{}", e.text)
     else:
         if not cfg:
-            continue
+            return
         for n in cfg.nodes:
             name, node, line = n
             if name in parsers:
                 parsers[name](path, line, node)
+
+def capture_lint(path):
+    # lint_file's diagnostic records and referenced resources for one
+    # file, for running in a worker process or recording in a LintState
+    global diagnostics, referenced
+    diagnostics = Diagnostics()
+    referenced = set()
+    lint_file(path)
+    return diagnostics.records, referenced
+
+def lint_batch(paths):
+    # capture_lint for each of paths, with the numeric checks run in bulk
+    # across all of them
+    global batch
+    batch = BatchChecks()
+    try:
+        results = [capture_lint(path) for path in paths]
+        batch.flush()
+    finally:
+        batch = None
+    return results
+
+def init_worker(res, cache, tables):
+    resources.update(res)
+    kspdata.parse_cache = cache
+    bind_schemas(tables)
+
+def lint_files(cfgfiles, jobs):
+    # capture_lint's results for the files, in order, as they are ready:
+    # lint_batch over batches of serial_batch files if jobs is 1,
+    # otherwise over batches of files sharded over worker processes
+    if jobs == 1:
+        for i in range(0, len(cfgfiles), serial_batch):
+            yield from lint_batch(cfgfiles[i:i + serial_batch])
+        return
+    if schema_tables == None:
+        load_schemas()
+    chunks = 4 * (jobs or os.cpu_count() or 1)
+    size = max(1, -(-len(cfgfiles) // chunks))
+    batches = [cfgfiles[i:i + size] for i in range(0, len(cfgfiles), size)]
+    with multiprocessing.Pool(jobs, init_worker,
+                              (resources, kspdata.parse_cache,
+                               schema_tables)) as pool:
+        for results in pool.imap(lint_batch, batches):
+            yield from results
+
+class LintState:
+    # Results of previous runs: per file, its content hash, diagnostic
+    # records (before any suppression) and the resources it referenced
+    # with a hash of their definitions at the time. A file is only linted
+    # again if it or one of those resources changed or this script or its
+    # schema file did.
+    def __init__(self, path):
+        self.path = path
+        version = sha1(open(__file__, "rb").read())
+        version.update(open(schema_path, "rb").read())
+        self.version = version.hexdigest()
+        self.files = {}
+        self.hashes = {}
+        self.fingerprints = {}
+        try:
+            with open(path, "rt") as f:
+                state = json.load(f)
+            if state["version"] == self.version:
+                self.files = state["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+    def file_hash(self, path):
+        if path not in self.hashes:
+            try:
+                data = open(os.path.expanduser(path), "rb").read()
+            except OSError:
+                self.hashes[path] = None
+            else:
+                self.hashes[path] = sha1(data).hexdigest()
+        return self.hashes[path]
+    def fingerprint(self, name):
+        if name not in self.fingerprints:
+            fp = None
+            if name in resources:
+                text = resources[name].ToString()
+                fp = sha1(text.encode("utf-8", "surrogateescape")).hexdigest()
+            self.fingerprints[name] = fp
+        return self.fingerprints[name]
+    def current(self, path):
+        entry = self.files.get(path)
+        if not entry or entry["hash"] != self.file_hash(path):
+            return False
+        for name, fp in entry["resources"].items():
+            if self.fingerprint(name) != fp:
+                return False
+        return True
+    def result(self, path):
+        entry = self.files[path]
+        records = [tuple(r[:5]) + (tuple(r[5]),) for r in entry["records"]]
+        return records, set(entry["resources"])
+    def update(self, path, result):
+        records, refs = result
+        if self.file_hash(path) == None:
+            self.files.pop(path, None)
+            return
+        self.files[path] = {
+            "hash": self.file_hash(path),
+            "records": records,
+            "resources": {name: self.fingerprint(name) for name in refs},
+        }
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wt") as f:
+            json.dump({"version": self.version, "files": self.files}, f)
+        os.replace(tmp, self.path)
+
+if __name__ == "__main__":
+    jobs = 1
+    state = None
+    output = "text"
+    suppress = set()
+    once = set()
+    options, cfgfiles = getopt.getopt(sys.argv[1:], shortopts, longopts)
+    for opt, arg in options:
+        if opt == "--cache":
+            kspdata.parse_cache = ParseCache(os.path.expanduser(arg))
+        elif opt in ("-j", "--jobs"):
+            jobs = int(arg) or None
+        elif opt == "--schema":
+            schema_path = os.path.expanduser(arg)
+        elif opt == "--format":
+            output = arg
+        elif opt == "--suppress":
+            suppress.update(arg.split(","))
+        elif opt == "--once":
+            once.update(arg.split(","))
+    try:
+        load_schemas()
+    except ConfigNodeError as e:
+        print(schema_path + e.message)
+        sys.exit(1)
+    # keep stdout to the emitter's output for the structured formats
+    emit = emitters[output]
+    messages = sys.stdout if output == "text" else sys.stderr
+    with redirect_stdout(messages):
+        for opt, arg in options:
+            if opt == "--gamedata":
+                find_all_resources(os.path.expanduser(arg))
+            elif opt == "--resources":
+                find_resources(os.path.expanduser(arg))
+            elif opt == "--state":
+                state = LintState(os.path.expanduser(arg))
+
+    todo = cfgfiles
+    if state:
+        todo = [path for path in cfgfiles if not state.current(path)]
+    linted = lint_files(todo, jobs)
+    pending = set(todo)
+
+    def file_records():
+        # the records of each file in input order, as each is ready
+        for path in cfgfiles:
+            if path in pending:
+                result = next(linted)
+                if state:
+                    state.update(path, result)
+            else:
+                result = state.result(path)
+            yield result[0]
+
+    seen = set()
+    errors = False
+    if output in streaming:
+        for records in file_records():
+            records = list(filter_records(records, suppress, once, seen))
+            if records:
+                emit(records, sys.stdout)
+                sys.stdout.flush()
+                errors = errors or has_errors(records)
+    else:
+        records = [r for records in file_records()
+                   for r in filter_records(records, suppress, once, seen)]
+        emit(records, sys.stdout)
+        errors = has_errors(records)
+    if state:
+        state.save()
+    sys.exit(errors and 1 or 0)
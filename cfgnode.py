@@ -19,23 +19,104 @@
 
 # <pep8 compliant>
 
-from script import Script
+import sys
+import mmap
+from array import array
+
+from script import Script, FastScript, ByteScript
 
 class ConfigNodeError(Exception):
     def __init__(self, fname, line, message):
         Exception.__init__(self, "%s:%d: %s" % (fname, line, message))
         self.message = "%s:%d: %s" % (fname, line, message)
         self.line = line
+        self.text = message
 
 def cfg_error(self, msg):
     raise ConfigNodeError(self.filename, self.line, msg)
 
+def entry_index(node, attr, entries):
+    # key -> [indices] map for entries (a node's values or nodes) if there
+    # are at least index_min of them, kept with the length of the list it
+    # was built for. AddValue and the like keep it up to date; it is also
+    # rebuilt when the list has changed length behind our back, but any
+    # other change made straight to a plain list (setting an item, del
+    # followed by append) must be followed by resetting the index
+    # (node.value_index = None or node.node_index = None).
+    index = getattr(node, attr)
+    if index == None or index[1] != len(entries):
+        if node.index_min == None or len(entries) < node.index_min:
+            return None
+        index = (build_index(entries), len(entries))
+        setattr(node, attr, index)
+    return index[0]
+
+def build_index(entries):
+    index = {}
+    for i, e in enumerate(entries):
+        if e[0] in index:
+            index[e[0]].append(i)
+        else:
+            index[e[0]] = [i]
+    return index
+
+class InternTable:
+    # Shares one string object between all equal keys (and, if asked, short
+    # values) seen by the loads it is passed to. Keys go through sys.intern
+    # so they are also identical to the literals used in lookups.
+    def __init__(self, values=False, max_value=5):
+        self.strings = {}
+        self.values = values
+        self.max_value = max_value
+        self.key_hits = self.key_misses = 0
+        self.value_hits = self.value_misses = 0
+    def key(self, s):
+        strings = self.strings
+        if s in strings:
+            self.key_hits += 1
+            return strings[s]
+        self.key_misses += 1
+        s = strings[s] = sys.intern(s)
+        return s
+    def value(self, s):
+        if not self.values or len(s) > self.max_value:
+            return s
+        strings = self.strings
+        if s in strings:
+            self.value_hits += 1
+            return strings[s]
+        self.value_misses += 1
+        s = strings[s] = sys.intern(s)
+        return s
+    def report(self):
+        lines = []
+        for kind, hits, misses in (("keys", self.key_hits, self.key_misses),
+                                   ("values", self.value_hits,
+                                    self.value_misses)):
+            total = hits + misses
+            rate = total and 100.0 * hits / total or 0.0
+            lines.append("%s: %d lookups, %d hits (%.1f%%), %d unique"
+                         % (kind, total, hits, rate, misses))
+        lines.append("table: %d strings" % len(self.strings))
+        return "\n".join(lines)
+
 class ConfigNode:
+    __slots__ = ("values", "nodes", "node_index", "value_index")
+    lazy = False
+    index_min = 8
     def __init__(self):
         self.values = []
         self.nodes = []
+        self.node_index = None
+        self.value_index = None
+    @classmethod
+    def ParseBlock(cls, script, line):
+        node = cls()
+        cls.ParseNode(node, script, False)
+        return node
     @classmethod
     def ParseNode(cls, node, script, top = False):
+        strings = getattr(script, "strings", None)
         while script.tokenAvailable(True):
             token_start = script.pos
             if script.getToken(True) == None:
@@ -58,92 +139,251 @@ class ConfigNode:
                     if script.tokenAvailable(False):
                         script.getLine()
                         value = script.token.strip()
+                    if strings != None:
+                        key = strings.key(key)
+                        value = strings.value(value)
                     node.values.append((key, value, line))
                     break
                 elif script.token == '{':
-                    new_node = ConfigNode()
-                    ConfigNode.ParseNode(new_node, script, False)
+                    if strings != None:
+                        key = strings.key(key)
+                    new_node = cls.ParseBlock(script, line)
                     node.nodes.append((key, new_node, line))
                     break
                 else:
                     #cfg_error(script, "unexpected " + script.token)
-                    key = script.text[token_start:token_end]
+                    key = script.getText(token_start, token_end)
         if not top:
             cfg_error(script, "unexpected end of file")
     @classmethod
-    def load(cls, text):
-        script = Script("", text, "{}=", False)
+    def ParseTree(cls, script):
+        # Same result as the ParseNode loop in load, but walks the token
+        # stream once with an explicit stack instead of recursing per node.
+        if not script.tokenAvailable(True):
+            return []
+        getToken = script.getToken
+        strings = getattr(script, "strings", None)
+        root = node = cls()
+        stack = []
+        while True:
+            token = getToken(True)
+            if token == None:
+                break
+            if token == "\xef\xbb\xbf":
+                continue
+            if token == '}':
+                if not stack:
+                    cfg_error(script, "unexpected }")
+                node = stack.pop()
+                continue
+            if token == '{' or token == '=':
+                cfg_error(script, "unexpected " + token)
+            key = token
+            token_end = script.pos
+            token_start = token_end - len(token)
+            multi = False
+            while True:
+                token = getToken(True)
+                if token == None:
+                    break
+                if token == '=':
+                    line = script.line
+                    value = ''
+                    if script.tokenAvailable(False):
+                        script.getLine()
+                        value = script.token.strip()
+                    if multi:
+                        key = script.getText(token_start, token_end)
+                    if strings != None:
+                        key = strings.key(key)
+                        value = strings.value(value)
+                    node.values.append((key, value, line))
+                    break
+                elif token == '{':
+                    if multi:
+                        key = script.getText(token_start, token_end)
+                    if strings != None:
+                        key = strings.key(key)
+                    new_node = cls()
+                    node.nodes.append((key, new_node, script.line))
+                    stack.append(node)
+                    node = new_node
+                    break
+                token_end = script.pos
+                multi = True
+        if stack:
+            cfg_error(script, "unexpected end of file")
+        return root
+    @classmethod
+    def loadscript(cls, script, iterative=False, strings=None):
         script.error = cfg_error.__get__(script, Script)
+        script.strings = strings
+        if iterative and not cls.lazy:
+            return cls.ParseTree(script)
         nodes = []
         while script.tokenAvailable(True):
-            node = ConfigNode()
-            ConfigNode.ParseNode(node, script, True)
+            node = cls()
+            cls.ParseNode(node, script, True)
             nodes.append(node)
         if len(nodes) == 1:
             return nodes[0]
         else:
             return nodes
     @classmethod
-    def loadfile(cls, path):
+    def load(cls, text, scriptclass=Script, iterative=False, strings=None):
+        script = scriptclass("", text, "{}=", False)
+        return cls.loadscript(script, iterative, strings)
+    @classmethod
+    def loadfile(cls, path, scriptclass=Script, iterative=False,
+                 mapped=False, strings=None, cache=None):
+        if cache and not cls.lazy and strings == None:
+            # see cfgcache.ParseCache. The node class and parse options are
+            # part of the key as they change what is stored. Interning is
+            # done while parsing, so a strings table bypasses the cache.
+            def parse(text):
+                return cls.load(text, scriptclass, iterative)
+            kind = "%s.%s:%s:%d" % (cls.__module__, cls.__name__,
+                                    scriptclass.__name__, bool(iterative))
+            return cache.load(path, parse, kind)
+        if mapped:
+            # tokenize the file straight from the page cache; keys and
+            # values are decoded as latin-1 as they are emitted
+            with open(path, "rb") as f:
+                try:
+                    text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    text = b""
+            try:
+                script = ByteScript("", text, "{}=", False)
+                return cls.loadscript(script, iterative, strings)
+            finally:
+                # lazy nodes parse from the map later, so leave it open
+                if isinstance(text, mmap.mmap) and not cls.lazy:
+                    text.close()
         bytes = open(path, "rb").read()
-        try:
-            text = "".join(map(lambda b: chr(b), bytes))
-        except TypeError:
-            text = bytes
-        return cls.load(text)
+        return cls.load(bytes.decode("latin-1"), scriptclass, iterative,
+                        strings)
+    def IndexNodes(self):
+        return entry_index(self, "node_index", self.nodes)
+    def IndexValues(self):
+        return entry_index(self, "value_index", self.values)
+    def __getstate__(self):
+        # every attribute but the lookup indices, which are rebuilt when
+        # needed
+        state = dict(getattr(self, "__dict__", ()))
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if name[-6:] != "_index" and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+    def __setstate__(self, state):
+        if type(state) == tuple:
+            # (None, slots) as pickled before there was a __getstate__
+            state = state[1]
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.node_index = None
+        self.value_index = None
     def GetNode(self, key):
+        index = self.IndexNodes()
+        if index != None:
+            if key in index:
+                return self.nodes[index[key][0]][1]
+            return None
         for n in self.nodes:
             if n[0] == key:
                 return n[1]
         return None
     def GetNodeLine(self, key):
+        index = self.IndexNodes()
+        if index != None:
+            if key in index:
+                return self.nodes[index[key][0]][2]
+            return None
         for n in self.nodes:
             if n[0] == key:
                 return n[2]
         return None
     def GetNodes(self, key):
+        index = self.IndexNodes()
+        if index != None:
+            nodes = self.nodes
+            return [nodes[i][1] for i in index.get(key, ())]
         nodes = []
         for n in self.nodes:
             if n[0] == key:
                 nodes.append(n[1])
         return nodes
     def GetValue(self, key):
+        index = self.IndexValues()
+        if index != None:
+            if key in index:
+                return self.values[index[key][0]][1].strip()
+            return None
         for v in self.values:
             if v[0] == key:
                 return v[1].strip()
         return None
     def HasNode(self, key):
+        index = self.IndexNodes()
+        if index != None:
+            return key in index
         for n in self.nodes:
             if n[0] == key:
                 return True
         return False
     def HasValue(self, key):
+        index = self.IndexValues()
+        if index != None:
+            return key in index
         for v in self.values:
             if v[0] == key:
                 return True
         return False
     def GetValueLine(self, key):
+        index = self.IndexValues()
+        if index != None:
+            if key in index:
+                return self.values[index[key][0]][2]
+            return None
         for v in self.values:
             if v[0] == key:
                 return v[2]
         return None
     def GetValues(self, key):
+        index = self.IndexValues()
+        if index != None:
+            values = self.values
+            return [values[i][1] for i in index.get(key, ())]
         values = []
         for v in self.values:
             if v[0] == key:
                 values.append(v[1])
         return values
     def AddNode(self, key, node):
+        index = self.IndexNodes()
         self.nodes.append((key, node))
+        if index != None:
+            index.setdefault(key, []).append(len(self.nodes) - 1)
+            self.node_index = index, len(self.nodes)
         return node
     def AddNewNode (self, key):
-        node = ConfigNode ()
-        self.nodes.append((key, node))
-        return node
+        return self.AddNode(key, type(self) ())
 
     def AddValue(self, key, value):
+        index = self.IndexValues()
         self.values.append((key, value))
+        if index != None:
+            index.setdefault(key, []).append(len(self.values) - 1)
+            self.value_index = index, len(self.values)
     def SetValue(self, key, value):
+        index = self.IndexValues()
+        if index != None:
+            if key in index:
+                self.values[index[key][0]] = key, value, 0
+                return
+            self.AddValue(key, value)
+            return
         for i in range(len(self.values)):
             if self.values[i][0] == key:
                 self.values[i] = key, value, 0
@@ -169,12 +409,299 @@ class ConfigNode:
             text[index] = "%s}\n" % ("    " * (level))
             index += 1
         return "".join(text)
+    def IterLines(self, level = 0):
+        # ToString's output a line at a time, walking the tree with an
+        # explicit stack instead of building every level's string
+        indents = [""]
+        def indent(i):
+            while i >= len(indents):
+                indents.append("    " * len(indents))
+            return indents[max(i, 0)]
+        stack = []
+        node = self
+        prefix = ""
+        while True:
+            if level >= 0:
+                yield prefix + "{\n"
+            elif prefix:
+                yield prefix
+            pad = indent(level + 1)
+            for val in node.values:
+                yield "%s%s = %s\n" % (pad, val[0], val[1])
+            stack.append((iter(node.nodes), level))
+            while stack:
+                nodes, level = stack[-1]
+                n = next(nodes, None)
+                if n != None:
+                    prefix = "%s%s " % (indent(level + 1), n[0])
+                    node = n[1]
+                    level += 1
+                    break
+                stack.pop()
+                if level >= 0:
+                    yield "%s}\n" % indent(level)
+                if stack:
+                    yield "\n"
+            else:
+                return
+    def Write(self, fileobj, level = 0, bufsize = 65536):
+        # stream ToString's output to fileobj in bufsize chunks
+        buf = []
+        size = 0
+        for line in self.IterLines(level):
+            buf.append(line)
+            size += len(line)
+            if size >= bufsize:
+                fileobj.write("".join(buf))
+                buf = []
+                size = 0
+        if buf:
+            fileobj.write("".join(buf))
+
+class LazyConfigNode(ConfigNode):
+    # Nested nodes are only brace-matched when their parent is parsed and
+    # keep a reference to their place in the source. Their own values and
+    # nodes are parsed the first time either is looked at, so any syntax
+    # error inside them is raised then rather than from load.
+    __slots__ = ("source",)
+    lazy = True
+    def __init__(self, script=None, pos=0, line=0):
+        if script:
+            self.source = script, pos, line
+            self.node_index = None
+            self.value_index = None
+        else:
+            ConfigNode.__init__(self)
+    @classmethod
+    def ParseBlock(cls, script, line):
+        node = cls(script, script.pos, line)
+        if not script.skipBlock():
+            cfg_error(script, "unexpected end of file")
+        return node
+    def __getattr__(self, name):
+        if name != "values" and name != "nodes":
+            raise AttributeError(name)
+        script, pos, line = self.source
+        script.pos = pos
+        script.line = line
+        script.unget = False
+        self.values = []
+        self.nodes = []
+        try:
+            LazyConfigNode.ParseNode(self, script, False)
+        except:
+            del self.values, self.nodes
+            raise
+        del self.source
+        return getattr(self, name)
+
+class EntryTable:
+    # List-like view of the values or nodes of a CompactConfigNode. The
+    # node keeps each table as one flat [key, item, key, item...] list and
+    # an array of line numbers, so no tuple or int is kept per entry and
+    # an empty table costs nothing. Indexing, slicing, del, insert, append,
+    # extend, pop and clear work as they do on a list; slices are read and
+    # written through a list of the entries. Changes that move or rekey
+    # entries reset the node's index for the table.
+    __slots__ = ("node", "data", "lines", "index")
+    def __init__(self, node, data, lines, index):
+        self.node = node
+        self.data = data
+        self.lines = lines
+        self.index = index
+    def append(self, entry):
+        data = getattr(self.node, self.data)
+        if data == None:
+            data = []
+            setattr(self.node, self.data, data)
+            setattr(self.node, self.lines, array("i"))
+        data.append(entry[0])
+        data.append(entry[1])
+        getattr(self.node, self.lines).append(len(entry) > 2 and entry[2] or 0)
+    def extend(self, entries):
+        for e in entries:
+            self.append(e)
+    def insert(self, i, entry):
+        n = len(self)
+        if i < 0:
+            i = max(i + n, 0)
+        i = min(i, n)
+        self.append(entry)
+        if i < n:
+            setattr(self.node, self.index, None)
+            data = getattr(self.node, self.data)
+            data[i * 2:i * 2] = data[-2:]
+            del data[-2:]
+            lines = getattr(self.node, self.lines)
+            lines.insert(i, lines.pop())
+    def pop(self, i=-1):
+        entry = self[i]
+        del self[i]
+        return entry
+    def clear(self):
+        setattr(self.node, self.data, None)
+        setattr(self.node, self.lines, None)
+        setattr(self.node, self.index, None)
+    def __len__(self):
+        lines = getattr(self.node, self.lines)
+        return lines and len(lines) or 0
+    def __iter__(self):
+        data = getattr(self.node, self.data)
+        if data == None:
+            return iter(())
+        return zip(data[0::2], data[1::2], getattr(self.node, self.lines))
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+        lines = getattr(self.node, self.lines) or ()
+        line = lines[i]
+        if i < 0:
+            i += len(lines)
+        data = getattr(self.node, self.data)
+        return data[i * 2], data[i * 2 + 1], line
+    def __setitem__(self, i, entry):
+        if isinstance(i, slice):
+            entries = list(self)
+            entries[i] = entry
+            self.clear()
+            self.extend(entries)
+            return
+        lines = getattr(self.node, self.lines) or ()
+        lines[i] = len(entry) > 2 and entry[2] or 0
+        if i < 0:
+            i += len(lines)
+        data = getattr(self.node, self.data)
+        if data[i * 2] != entry[0]:
+            setattr(self.node, self.index, None)
+        data[i * 2] = entry[0]
+        data[i * 2 + 1] = entry[1]
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            entries = list(self)
+            del entries[i]
+            self.clear()
+            self.extend(entries)
+            return
+        lines = getattr(self.node, self.lines) or []
+        del lines[i]
+        if i < 0:
+            i += len(lines) + 1
+        del getattr(self.node, self.data)[i * 2:i * 2 + 2]
+        setattr(self.node, self.index, None)
+
+def entry_table(data, lines, index):
+    def get(self):
+        return EntryTable(self, data, lines, index)
+    def set(self, entries):
+        table = EntryTable(self, data, lines, index)
+        table.clear()
+        table.extend(entries)
+    return property(get, set)
+
+class CompactConfigNode(ConfigNode):
+    # ConfigNode with its values and nodes stored as EntryTables. Use
+    # CompactConfigNode.load/loadfile to parse a whole tree this way.
+    __slots__ = ("value_data", "value_lines", "node_data", "node_lines")
+    values = entry_table("value_data", "value_lines", "value_index")
+    nodes = entry_table("node_data", "node_lines", "node_index")
+    def __init__(self):
+        self.value_data = self.value_lines = None
+        self.node_data = self.node_lines = None
+        self.node_index = None
+        self.value_index = None
+    def __getstate__(self):
+        return (self.value_data, self.value_lines,
+                self.node_data, self.node_lines)
+    def __setstate__(self, state):
+        self.value_data, self.value_lines = state[:2]
+        self.node_data, self.node_lines = state[2:]
+        self.node_index = None
+        self.value_index = None
+
+START_NODE = "start_node"
+VALUE = "value"
+END_NODE = "end_node"
+
+def parse_events(script, strings=None):
+    # Incremental form of ConfigNode.ParseTree: yields
+    # (START_NODE, name, None, line), (VALUE, key, value, line) and
+    # (END_NODE, None, None, line) tuples without building any nodes.
+    script.error = cfg_error.__get__(script, Script)
+    getToken = script.getToken
+    depth = 0
+    while True:
+        token = getToken(True)
+        if token == None:
+            break
+        if token == "\xef\xbb\xbf":
+            continue
+        if token == '}':
+            if not depth:
+                cfg_error(script, "unexpected }")
+            depth -= 1
+            yield END_NODE, None, None, script.line
+            continue
+        if token == '{' or token == '=':
+            cfg_error(script, "unexpected " + token)
+        key = token
+        token_end = script.pos
+        token_start = token_end - len(token)
+        multi = False
+        while True:
+            token = getToken(True)
+            if token == None:
+                break
+            if token == '=':
+                line = script.line
+                value = ''
+                if script.tokenAvailable(False):
+                    script.getLine()
+                    value = script.token.strip()
+                if multi:
+                    key = script.getText(token_start, token_end)
+                if strings != None:
+                    key = strings.key(key)
+                    value = strings.value(value)
+                yield VALUE, key, value, line
+                break
+            elif token == '{':
+                if multi:
+                    key = script.getText(token_start, token_end)
+                if strings != None:
+                    key = strings.key(key)
+                depth += 1
+                yield START_NODE, key, None, script.line
+                break
+            token_end = script.pos
+            multi = True
+    if depth:
+        cfg_error(script, "unexpected end of file")
+
+def iterload(text, scriptclass=FastScript, strings=None):
+    return parse_events(scriptclass("", text, "{}=", False), strings)
+
+def iterloadfile(path, strings=None):
+    with open(path, "rb") as f:
+        try:
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return
+    try:
+        yield from parse_events(ByteScript("", text, "{}=", False), strings)
+    finally:
+        text.close()
 
 if __name__ == "__main__":
-    import sys
-    for arg in sys.argv[1:]:
+    strings = None
+    args = sys.argv[1:]
+    if args[:1] == ["--intern-stats"]:
+        strings = InternTable(True)
+        args = args[1:]
+    for arg in args:
         text = open(arg, "rt").read()
         try:
-            node = ConfigNode.load(text)
+            node = ConfigNode.load(text, strings=strings)
         except ConfigNodeError as e:
             print(arg+e.message)
+    if strings:
+        print(strings.report())
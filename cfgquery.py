@@ -0,0 +1,276 @@
+# vim:ts=4:et
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Path queries over ConfigNode trees, eg
+#   GAME/FLIGHTSTATE/VESSEL[type=Flag]/PART[name=flag]
+#   VESSEL[type!=Debris]/@name
+# A query is a list of steps separated by /, each selecting the child
+# nodes with the given name (* for any) from the nodes the steps before it
+# selected, starting with the node the query is run on. A step may have
+# any number of predicates on the node's values, all of which must hold:
+#   [key=value]     the (first) value of key is value
+#   [key!=value]    the node has no key or its value is not value
+#   [key]           the node has a key value
+#   [!key]          the node has no key value
+# A final @key step selects the values of key of the nodes instead.
+
+import sys
+
+from cfgnode import *
+
+class QueryError(Exception):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.message = message
+
+def parse_predicate(path, text):
+    if "=" not in text:
+        if text[:1] == "!":
+            return text[1:].strip(), "missing", None
+        return text.strip(), "present", None
+    key, value = text.split("=", 1)
+    op = "="
+    if key[-1:] == "!":
+        key = key[:-1]
+        op = "!="
+    key = key.strip()
+    if not key:
+        raise QueryError("%s: predicate without a key: [%s]" % (path, text))
+    return key, op, value.strip()
+
+def parse_query(path):
+    # The steps of path as (name, predicates) and the key of a final @key
+    # step (None if there is none)
+    steps = []
+    value_key = None
+    pos = 0
+    while True:
+        if value_key != None:
+            raise QueryError("%s: @%s must be the last step"
+                             % (path, value_key))
+        end = pos
+        while end < len(path) and path[end] not in "/[]":
+            end += 1
+        name = path[pos:end].strip()
+        if not name:
+            raise QueryError("%s: empty step at %d" % (path, pos))
+        preds = []
+        while end < len(path) and path[end] == "[":
+            close = path.find("]", end)
+            if close < 0:
+                raise QueryError("%s: unterminated [" % path)
+            preds.append(parse_predicate(path, path[end + 1:close]))
+            end = close + 1
+        if name[0] == "@":
+            if preds:
+                raise QueryError("%s: predicates on %s" % (path, name))
+            value_key = name[1:]
+        else:
+            steps.append((name, tuple(preds)))
+        if end == len(path):
+            break
+        if path[end] != "/":
+            raise QueryError("%s: expected / at %d" % (path, end))
+        pos = end + 1
+    if not steps and value_key == None:
+        raise QueryError("%s: empty query" % path)
+    return tuple(steps), value_key
+
+def test(preds, get):
+    # get(key) gives the first value of key, or None
+    for key, op, value in preds:
+        v = get(key)
+        if op == "=":
+            if v != value:
+                return False
+        elif op == "!=":
+            if v == value:
+                return False
+        elif op == "present":
+            if v == None:
+                return False
+        elif v != None:
+            return False
+    return True
+
+class Query:
+    # A compiled path query. Use compile_query rather than Query so each
+    # path is only compiled once.
+    def __init__(self, path):
+        self.path = path
+        self.steps, self.value_key = parse_query(path)
+        self.pred_keys = [{p[0] for p in preds} for name, preds in self.steps]
+    def __repr__(self):
+        return "Query(%r)" % self.path
+    def entries(self, node):
+        # (parent, index) of each node the steps select, in tree order
+        if not self.steps:
+            return []
+        found = [(None, node)]
+        for name, preds in self.steps:
+            matches = []
+            for parent, n in found:
+                for i, entry in enumerate(n.nodes):
+                    if name != "*" and entry[0] != name:
+                        continue
+                    if not preds or test(preds, entry[1].GetValue):
+                        matches.append((n, i))
+            found = [(parent, parent.nodes[i][1]) for parent, i in matches]
+        return matches
+    def select(self, node):
+        # the nodes (or values for @key) the query selects under node
+        if self.steps:
+            nodes = [parent.nodes[i][1] for parent, i in self.entries(node)]
+        else:
+            nodes = [node]
+        if self.value_key == None:
+            return nodes
+        return [v for n in nodes for v in n.GetValues(self.value_key)]
+    def first(self, node):
+        # the first result of select, or None
+        results = self.select(node)
+        return results[0] if results else None
+    def stream(self, events, nodeclass=ConfigNode):
+        # select run on the (START_NODE/VALUE/END_NODE) event stream of
+        # parse_events, yielding results as soon as they are known: only
+        # the selected nodes are built (as nodeclass), and the subtrees no
+        # step can match are skipped. A predicate is decided as soon as the
+        # first values of all its keys have been seen, otherwise when its
+        # node ends; results found under a node whose predicates are still
+        # undecided wait for them.
+        steps = self.steps
+        count = len(steps)
+        value_key = self.value_key
+        # per open node on the path: [level, predicate values, state,
+        # held results]; state is True, False or None (undecided)
+        frames = [[0, None, True, None]]
+        skip = 0
+        build = []      # the nodes being built, innermost last
+        def deliver(results):
+            for frame in reversed(frames):
+                if frame[2] == None:
+                    frame[3].extend(results)
+                    return []
+            return results
+        for event, key, value, line in events:
+            if skip:
+                if event == START_NODE:
+                    skip += 1
+                elif event == END_NODE:
+                    skip -= 1
+                continue
+            if build:
+                if event == START_NODE:
+                    node = nodeclass()
+                    build[-1].nodes.append((key, node, line))
+                    build.append(node)
+                    continue
+                if event == VALUE:
+                    build[-1].values.append((key, value, line))
+                    if len(build) > 1:
+                        continue
+                else:
+                    node = build.pop()
+                    if build:
+                        continue
+            frame = frames[-1]
+            level = frame[0]
+            if event == START_NODE:
+                if level == count:
+                    skip = 1
+                    continue
+                name, preds = steps[level]
+                if name != "*" and key != name:
+                    skip = 1
+                    continue
+                state = None if preds else True
+                frames.append([level + 1, {}, state, []])
+                if level + 1 == count and value_key == None:
+                    build.append(nodeclass())
+            elif event == VALUE:
+                if level == count and value_key != None and key == value_key:
+                    if not level:
+                        yield value
+                    else:
+                        frame[3].append(value)
+                if frame[2] != None or level == 0:
+                    continue
+                values = frame[1]
+                if key in self.pred_keys[level - 1] and key not in values:
+                    values[key] = value
+                    if len(values) == len(self.pred_keys[level - 1]):
+                        frame[2] = test(steps[level - 1][1], values.get)
+                        if not frame[2]:
+                            # nothing more is wanted from this node
+                            frames.pop()
+                            del build[:]
+                            skip = 1
+                        elif frame[3]:
+                            # what was held goes before anything found
+                            # from here on
+                            held = frame[3]
+                            frame[3] = []
+                            yield from deliver(held)
+            else:
+                frames.pop()
+                if frame[2] == None:
+                    frame[2] = test(steps[level - 1][1], frame[1].get)
+                if not frame[2]:
+                    continue
+                results = frame[3]
+                if level == count and value_key == None:
+                    results = [node]
+                yield from deliver(results)
+
+queries = {}    # path: Query
+
+def compile_query(path):
+    query = queries.get(path)
+    if query == None:
+        query = queries[path] = Query(path)
+    return query
+
+def select(path, node):
+    return compile_query(path).select(node)
+
+def select_file(path, filename):
+    # the results of path in the file filename, found without loading it
+    return compile_query(path).stream(iterloadfile(filename))
+
+if __name__ == "__main__":
+    # cfgquery.py query file...: print what query selects in each file
+    if len(sys.argv) < 3:
+        print("usage: cfgquery.py query file...")
+        sys.exit(1)
+    try:
+        query = compile_query(sys.argv[1])
+    except QueryError as e:
+        print(e.message)
+        sys.exit(1)
+    for filename in sys.argv[2:]:
+        try:
+            for result in query.stream(iterloadfile(filename)):
+                if query.value_key != None:
+                    print("%s: %s" % (filename, result))
+                else:
+                    print(query.steps[-1][0] + " " + result.ToString(), end="")
+        except ConfigNodeError as e:
+            print(filename + e.message)
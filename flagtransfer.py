@@ -19,19 +19,20 @@
 
 # <pep8 compliant>
 
-from cfgnode import ConfigNode
+from cfgedit import ConfigEditor
+from cfgquery import compile_query
 import sys
 
 src = sys.argv[1]
 dst = sys.argv[2]
 out = sys.argv[3]
 
-src_text = open(src, "rt").read()
-dst_text = open(dst, "rt").read()
-src_node = ConfigNode.load(src_text)
-src_game = src_node.GetNode('GAME')
-dst_node = ConfigNode.load(dst_text)
-dst_game = dst_node.GetNode('GAME')
+# The flags are copied over as they are in the source and the destination
+# is otherwise written back untouched.
+src_edit = ConfigEditor.loadfile(src)
+dst_edit = ConfigEditor.loadfile(dst)
+src_game = src_edit.root.GetNode('GAME')
+dst_game = dst_edit.root.GetNode('GAME')
 if not src_game:
     print("could not find source GAME")
     sys.exit(1)
@@ -48,10 +49,8 @@ if not dst_flightstate:
     print("could not find destination FLIGHTSTATE")
     sys.exit(1)
 
-vessels = src_flightstate.GetNodes("VESSEL")
-for v in vessels:
-    if v.GetValue("type") != "Flag":
-        continue
+for parent, i in compile_query("VESSEL[type=Flag]").entries(src_flightstate):
+    v = parent.nodes[i][1]
     parts = v.GetNodes("PART")
     if len(parts) != 1:
         continue
@@ -59,7 +58,8 @@ for v in vessels:
     if p.GetValue("name") != "flag":
         continue
     print (v.GetValue("name"))
-    dst_flightstate.nodes.append(("VESSEL", v))
+    dst_edit.AddNode(dst_flightstate, "VESSEL", v,
+                     src_edit.NodeText(src_flightstate, i))
 
-open(out, "wt").write("GAME " + dst_game.ToString ())
+dst_edit.write(out)
 sys.exit(0)
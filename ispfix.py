@@ -21,6 +21,7 @@
 
 from cfgnode import *
 from kspdata import *
+from partcatalog import PartCatalog
 from pprint import *
 import sys
 import os
@@ -53,49 +54,24 @@ engine_blacklist = {
 }
 engine_isp = {}
 
-def collect_isps(path):
-    if path[-4:].lower() != ".cfg":
-        return
-    text = open(path, "rt").read()
-    try:
-        cfg = ConfigNode.load(text)
-    except ConfigNodeError as e:
-        #print(path+e.message)
-        return
-    lineoffs = 0
-    for n in cfg.nodes:
-        name, node, line = n
-        if name != "PART":
-            continue
-        mass = node.GetValue("mass");
-        engines = engine_modules (node)
-        if not engines:
-            continue
+def engine_parts(catalog):
+    # each part with engine modules, and those modules
+    for part in catalog.find(module=("ModuleEngines", "ModuleEnginesFX")):
+        engines = engine_modules(part.node)
+        if engines:
+            yield part, engines
+
+def collect_isps(catalog):
+    for part, engines in engine_parts(catalog):
         for e in engines:
             atmCrv = e.GetNode ("atmosphereCurve")
             keys = atmCrv.GetValues("key")
             isp = keys[0].split(" ")[1]
-            engine_isp[node.GetValue("name")] = isp
+            engine_isp[part.name] = isp
 
-def find_engines(path):
-    if path[-4:].lower() != ".cfg":
-        return
-    text = open(path, "rt").read()
-    try:
-        cfg = ConfigNode.load(text)
-    except ConfigNodeError as e:
-        #print(path+e.message)
-        return
-    lineoffs = 0
-    for n in cfg.nodes:
-        name, node, line = n
-        if name != "PART":
-            continue
-        mass = node.GetValue("mass");
-        engines = engine_modules (node)
-        if not engines:
-            continue
-        pname = node.GetValue("name")
+def find_engines(catalog):
+    for part, engines in engine_parts(catalog):
+        pname = part.name
         if pname in engine_blacklist:
             continue
         print("@PART[%s] {" % pname)
@@ -113,6 +89,6 @@ def find_engines(path):
             print("\t}")
         print("}")
 
-recurse_tree("/home/bill/ksp/KSP_linux-0.90/GameData/Squad", collect_isps)
-recurse_tree("/home/bill/ksp/KSP_linux-0.90/GameData/NASAmission", collect_isps)
-recurse_tree("/home/bill/ksp/KSP_linux/GameData/Squad", find_engines)
+collect_isps(PartCatalog.load("/home/bill/ksp/KSP_linux-0.90/GameData/Squad"))
+collect_isps(PartCatalog.load("/home/bill/ksp/KSP_linux-0.90/GameData/NASAmission"))
+find_engines(PartCatalog.load("/home/bill/ksp/KSP_linux/GameData/Squad"))
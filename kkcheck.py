@@ -20,22 +20,12 @@
 # <pep8 compliant>
 
 from cfgnode import *
+from cfgedit import ConfigEditor
+from kspdata import recurse_tree
 import sys
 import os
 from uuid import uuid4
 
-def recurse_tree(path, func):
-    files = os.listdir(path)
-    files.sort()
-    for f in files:
-        if f[0] in [".", "_"]:
-            continue
-        p = os.path.join(path, f)
-        if os.path.isdir(p):
-            recurse_tree(p, func)
-        else:
-            func(p)
-
 static_by_uuid = {}
 
 def find_statics(path):
@@ -73,20 +63,18 @@ for u in static_by_uuid:
             print("   ", d[0], d[1])
             files_to_fix.add(d[2])
 
+# Only the UUIDs are replaced: the rest of each file, comments and all, is
+# left as it is.
 while files_to_fix:
     path = files_to_fix.pop()
-    node = ConfigNode.loadfile(path)
-    of = open(path, "wt")
-    for n in node.nodes:
+    edit = ConfigEditor.loadfile(path)
+    for n in edit.root.nodes:
         if n[0].split(':', 1)[0] != 'STATIC':
             continue
         static = n[1]
-        pname = static.GetValue("pointername")
         instances = static.GetNodes("Instances")
         for inst in instances:
-            group = inst.GetValue("Group")
             uuid = genUUID()
             print(inst.GetValue("UUID"), uuid)
-            inst.SetValue("UUID", uuid)
-        of.write(n[0] + " " + static.ToString())
-    of.close()
+            edit.SetValue(inst, "UUID", uuid)
+    edit.write()
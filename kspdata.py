@@ -23,46 +23,121 @@ from cfgnode import *
 from pprint import *
 import sys
 import os
+import multiprocessing
 
 resources = {}
+resource_defs = {}      # name: ResourceDefinition, made by get_resource
+parse_cache = None      # a cfgcache.ParseCache to reuse parse trees
 
+def parse_float(value, default):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
 
-def recurse_tree(path, func):
-    files = os.listdir(path)
-    files.sort()
-    for f in files:
-        if f[0] in [".", "_"]:
+def parse_bool(value, default):
+    if value == None or value.upper() not in ("TRUE", "FALSE"):
+        return default
+    return value.upper() == "TRUE"
+
+class ResourceDefinition:
+    # The values of a RESOURCE_DEFINITION converted once, with KSP's
+    # defaults in place of missing or invalid ones.
+    __slots__ = ("name", "node", "density", "volume", "unitCost", "hsp",
+                 "isTweakable", "isVisible", "flowMode", "transfer")
+    def __init__(self, name, node):
+        self.name = name
+        self.node = node
+        self.density = parse_float(node.GetValue("density"), 1.0)
+        self.volume = parse_float(node.GetValue("volume"), 5.0)
+        self.unitCost = parse_float(node.GetValue("unitCost"), 0.0)
+        self.hsp = parse_float(node.GetValue("hsp"), 0.0)
+        self.isTweakable = parse_bool(node.GetValue("isTweakable"), True)
+        self.isVisible = parse_bool(node.GetValue("isVisible"), True)
+        self.flowMode = node.GetValue("flowMode") or "NO_FLOW"
+        self.transfer = node.GetValue("transfer") or "NONE"
+    def __repr__(self):
+        return "ResourceDefinition(%r)" % self.name
+
+def get_resource(name):
+    # The ResourceDefinition for resources[name] (KeyError if there is no
+    # such resource), made on first use and again only if the definition
+    # is replaced.
+    node = resources[name]
+    res = resource_defs.get(name)
+    if res == None or res.node is not node:
+        res = resource_defs[name] = ResourceDefinition(name, node)
+    return res
+
+
+def scan_tree(path, files=None):
+    # the files recurse_tree visits, in the order it visits them
+    if files == None:
+        files = []
+    with os.scandir(path) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for e in entries:
+        if e.name[0] in [".", "_"]:
             continue
-        p = os.path.join(path, f)
-        if os.path.isdir(p):
-            recurse_tree(p, func)
+        if e.is_dir():
+            scan_tree(e.path, files)
         else:
-            func(p)
+            files.append(e.path)
+    return files
 
-def find_resources(path):
+def recurse_tree(path, func):
+    for p in scan_tree(path):
+        func(p)
+
+def map_files(files, func, processes=None, chunksize=8):
+    # (path, func(path)) for each of files, in order. func runs in a pool
+    # of worker processes, so it must be a module level function and its
+    # result picklable.
+    if processes == 1 or not files:
+        return list(zip(files, map(func, files)))
+    with multiprocessing.Pool(processes) as pool:
+        return list(zip(files, pool.imap(func, files, chunksize)))
+
+def map_tree(path, func, processes=None, chunksize=8):
+    # map_files for every file under path, in recurse_tree order
+    return map_files(scan_tree(path), func, processes, chunksize)
+
+def read_resources(path):
     if path[-4:].lower() != ".cfg":
-        return
+        return [], None
     try:
-        cfg = ConfigNode.loadfile(path)
+        cfg = ConfigNode.loadfile(path, cache=parse_cache)
     except ConfigNodeError as e:
-        print(path+e.message)
-        return
+        return [], path+e.message
     if not cfg:
-        return
+        return [], None
+    defs = []
     for node in cfg.nodes:
         if node[0] == "RESOURCE_DEFINITION":
             res = node[1]
-            resname = res.GetValue("name")
-            resources[resname] = res
-                
+            defs.append((res.GetValue("name"), res))
+    return defs, None
+
+def add_resources(defs, message):
+    if message:
+        print(message)
+    for resname, res in defs:
+        resources[resname] = res
+
+def find_resources(path):
+    add_resources(*read_resources(path))
+
+def find_all_resources(path, processes=None):
+    # recurse_tree(path, find_resources) with the parsing spread over
+    # processes; resources are merged in the same order
+    for p, result in map_tree(path, read_resources, processes):
+        add_resources(*result)
+
 def get_resource_cost(nodes):
     cost = 0.0
     for resnode in nodes:
         name = resnode.GetValue("name")
         amount = resnode.GetValue("amount")
         maxAmount = resnode.GetValue("maxAmount")
-        rescost = resources[name].GetValue("unitCost")
-        if rescost == None:
-            rescost = 0
-        cost += float(maxAmount) * float(rescost)
+        cost += float(maxAmount) * get_resource(name).unitCost
     return cost
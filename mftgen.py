@@ -20,10 +20,14 @@
 # <pep8 compliant>
 
 from cfgnode import *
+from cfgcache import ParseCache
+from partcatalog import PartCatalog
+import kspdata
 from kspdata import *
 from pprint import *
 import sys
 import os
+import getopt
 
 kerbals = {
     "kerbalEVAVintage",
@@ -105,19 +109,10 @@ part_blacklist = {
 
     "MEMLander",
 }
-def find_parts(path):
-    if path[-4:].lower() != ".cfg":
-        return
-    try:
-        cfg = ConfigNode.loadfile(path)
-    except ConfigNodeError as e:
-        #print(path+e.message)
-        return
-    for n in cfg.nodes:
-        name, node, line = n
-        if name != "PART":
-            continue
-        pname = node.GetValue("name")
+def find_parts(catalog):
+    for part in catalog.parts:
+        node = part.node
+        pname = part.name
         if pname in kerbals:
             continue
         resnodes = node.GetNodes("RESOURCE")
@@ -134,7 +129,7 @@ def find_parts(path):
                 continue
             pres.add(rname)
             maxAmount = float(rn.GetValue("maxAmount"))
-            resmass += maxAmount * float(resources[rname].GetValue("density"))
+            resmass += maxAmount * get_resource(rname).density
             ut = utilizations[rname]
             #print("//", rname, maxAmount, ut)
             if ut > 0:
@@ -169,6 +164,12 @@ def find_parts(path):
                 module.AddValue("basemass", "volume * %g" % bm)
         print("@PART[%s] %s" % (pname, apart.ToString()))
 
-recurse_tree("/home/bill/ksp/KSP_linux-1.4.1/GameData", find_resources)
-gamedata = sys.argv[1]
-recurse_tree(gamedata, find_parts)
+options, args = getopt.getopt(sys.argv[1:], "", ["cache="])
+cachedir = None
+for opt, arg in options:
+    if opt == "--cache":
+        cachedir = os.path.expanduser(arg)
+        kspdata.parse_cache = ParseCache(cachedir)
+find_all_resources("/home/bill/ksp/KSP_linux-1.4.1/GameData")
+gamedata = args[0]
+find_parts(PartCatalog.load(gamedata, cachedir))
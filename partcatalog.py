@@ -0,0 +1,221 @@
+# vim:ts=4:et
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+import os
+import pickle
+import sys
+from hashlib import sha1
+
+from cfgnode import *
+import kspdata
+from kspdata import scan_tree, map_files
+
+catalog_format = 4      # bump when what is pickled changes
+
+class Part:
+    # One PART of the catalog. The nodes of all the parts in a file are
+    # kept pickled together in nodes[0] until one of them is used.
+    __slots__ = ("name", "path", "line", "module_names", "resource_names",
+                 "propellant_names", "nodes", "i")
+    def __init__(self, name, path, line, module_names, resource_names,
+                 propellant_names, nodes, i):
+        self.name = name
+        self.path = path
+        self.line = line
+        self.module_names = module_names
+        self.resource_names = resource_names
+        self.propellant_names = propellant_names
+        self.nodes = nodes
+        self.i = i
+    def __repr__(self):
+        return "Part(%r, %r, %d)" % (self.name, self.path, self.line)
+    @property
+    def node(self):
+        nodes = self.nodes
+        if type(nodes[0]) == bytes:
+            nodes[0] = pickle.loads(nodes[0])
+        return nodes[0][self.i]
+    def modules(self, name=None):
+        # the MODULE nodes, or those with the given name
+        modules = self.node.GetNodes("MODULE")
+        if name == None:
+            return modules
+        return [m for m in modules if m.GetValue("name") == name]
+
+def read_parts(path):
+    # The (name, line, module names, resource names, propellant names) of
+    # each PART in a cfg file, and the PART nodes pickled. The propellants
+    # are those of all the part's modules.
+    parts = []
+    nodes = []
+    try:
+        cfg = ConfigNode.loadfile(path, cache=kspdata.parse_cache)
+    except ConfigNodeError as e:
+        cfg = None
+    if cfg:
+        for name, node, line in cfg.nodes:
+            if name != "PART":
+                continue
+            modules = node.GetNodes("MODULE")
+            props = [p.GetValue("name") for m in modules
+                     for p in m.GetNodes("PROPELLANT")]
+            modules = [m.GetValue("name") for m in modules]
+            res = [r.GetValue("name") for r in node.GetNodes("RESOURCE")]
+            parts.append((node.GetValue("name"), line, modules, res, props))
+            nodes.append(node)
+    return parts, pickle.dumps(nodes, pickle.HIGHEST_PROTOCOL)
+
+def add_index(index, key, i):
+    if key in index:
+        index[key].append(i)
+    else:
+        index[key] = [i]
+
+class PartCatalog:
+    # Every PART under root, in recurse_tree order, indexed by name, by
+    # module, resource and propellant names and by file. Given a cachedir
+    # (eg that of the ParseCache), load keeps the catalog there and only
+    # reparses the files whose size or mtime changed since it was saved;
+    # otherwise nothing is written. Catalogs are .catalog files, which a
+    # ParseCache sharing the directory leaves alone.
+    def __init__(self, root, cachedir=None):
+        self.root = os.path.abspath(root)
+        self.cachedir = cachedir
+        self.files = {}     # path: (mtime_ns, size) + read_parts(path)
+        self.changed = False
+        self.index()
+    @classmethod
+    def load(cls, root, cachedir=None, processes=None):
+        catalog = cls(root, cachedir)
+        if not cachedir:
+            catalog.update(processes)
+            return catalog
+        try:
+            with open(catalog.cachefile(), "rb") as f:
+                data = pickle.load(f)
+            if (data["format"] == catalog_format
+                and data["root"] == catalog.root):
+                catalog.files = data["files"]
+        except (OSError, EOFError, KeyError, TypeError,
+                pickle.UnpicklingError):
+            pass
+        catalog.update(processes)
+        if catalog.changed:
+            catalog.save()
+        return catalog
+    def cachefile(self):
+        name = sha1(self.root.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.cachedir, "parts-" + name + ".catalog")
+    def update(self, processes=None):
+        # bring the catalog up to date with the files under root
+        files = {}
+        stale = []
+        for path in scan_tree(self.root):
+            if path[-4:].lower() != ".cfg":
+                continue
+            st = os.stat(path)
+            entry = self.files.get(path)
+            if entry and entry[:2] == (st.st_mtime_ns, st.st_size):
+                files[path] = entry
+            else:
+                files[path] = (st.st_mtime_ns, st.st_size)
+                stale.append(path)
+        for path, parts in map_files(stale, read_parts, processes):
+            files[path] = files[path] + parts
+        self.changed = bool(stale) or len(files) != len(self.files)
+        self.files = files
+        self.index()
+    def save(self):
+        os.makedirs(self.cachedir, exist_ok=True)
+        data = {
+            "format": catalog_format,
+            "root": self.root,
+            "files": self.files,
+        }
+        cachefile = self.cachefile()
+        tmp = "%s.%d.tmp" % (cachefile, os.getpid())
+        with open(tmp, "wb") as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cachefile)
+        self.changed = False
+    def index(self):
+        self.parts = []
+        self.by_name = {}
+        self.by_module = {}
+        self.by_resource = {}
+        self.by_propellant = {}
+        self.by_file = {}
+        for path, entry in self.files.items():
+            nodes = [entry[3]]
+            for j, (name, line, modules, res, props) in enumerate(entry[2]):
+                i = len(self.parts)
+                self.parts.append(Part(name, path, line, modules, res, props,
+                                       nodes, j))
+                add_index(self.by_name, name, i)
+                add_index(self.by_file, path, i)
+                for module in set(modules):
+                    add_index(self.by_module, module, i)
+                for resource in set(res):
+                    add_index(self.by_resource, resource, i)
+                for propellant in set(props):
+                    add_index(self.by_propellant, propellant, i)
+    def find(self, name=None, module=None, resource=None, propellant=None,
+             path=None, where=None):
+        # The parts matching all of the given criteria, in catalog order.
+        # name, module, resource, propellant and path may each be a single
+        # key or a collection of keys (any of which match). where is called
+        # on each part left and keeps those for which it returns true, eg
+        # find(module="ModuleEnginesFX",
+        #      where=lambda p: "IntakeAir" not in p.propellant_names)
+        found = None
+        for index, keys in ((self.by_name, name),
+                            (self.by_module, module),
+                            (self.by_resource, resource),
+                            (self.by_propellant, propellant),
+                            (self.by_file, path)):
+            if keys == None:
+                continue
+            if type(keys) == str:
+                keys = (keys,)
+            matches = set()
+            for key in keys:
+                matches.update(index.get(key, ()))
+            found = matches if found == None else found & matches
+        if found == None:
+            parts = self.parts
+        else:
+            parts = [self.parts[i] for i in sorted(found)]
+        if where:
+            parts = [p for p in parts if where(p)]
+        return parts
+    def get(self, name):
+        # the first part of the given name, or None
+        if name in self.by_name:
+            return self.parts[self.by_name[name][0]]
+        return None
+
+if __name__ == "__main__":
+    # partcatalog.py root [module]: list the parts under root (with the
+    # given module)
+    catalog = PartCatalog.load(sys.argv[1])
+    module = sys.argv[2] if len(sys.argv) > 2 else None
+    for part in catalog.find(module=module):
+        print("%s:%d: %s" % (part.path, part.line, part.name))
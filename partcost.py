@@ -21,9 +21,12 @@
 
 from cfgnode import *
 from kspdata import *
+from partcatalog import PartCatalog
+from cfgcolumns import float_column, multiply, add, sum_by
 from pprint import *
 import sys
 import os
+import re
 
 markup = {
     "tank": 1.2,
@@ -129,39 +132,74 @@ part_type={
     "adapter3m1m7":"structural",
 }
 
-def find_parts(path):
-    if path[-4:].lower() != ".cfg":
-        return
-    text = open(path, "rt").read()
-    try:
-        cfg = ConfigNode.load(text)
-    except ConfigNodeError as e:
-        #print(path+e.message)
-        return
-    lineoffs = 0
-    for n in cfg.nodes:
-        name, node, line = n
-        if name != "PART":
+def part_costs(parts):
+    # The new cost of each part: mass * markup * rp_cost plus the cost of
+    # its resources, worked out a column at a time. Parts whose mass is not
+    # a number get None.
+    masses, bad = float_column([p.node.GetValue("mass") for p in parts])
+    markups = [markup[part_type[p.name]] for p in parts]
+    amounts = []
+    unit_costs = []
+    owners = []
+    for i, p in enumerate(parts):
+        for resnode in p.node.GetNodes("RESOURCE"):
+            amounts.append(resnode.GetValue("maxAmount"))
+            unit_costs.append(get_resource(resnode.GetValue("name")).unitCost)
+            owners.append(i)
+    amounts, bad_amounts = float_column(amounts)
+    rescosts = sum_by(multiply(amounts, unit_costs), owners, len(parts))
+    costs = add(multiply(masses, markups, [rp_cost] * len(parts)), rescosts)
+    costs = list(costs)
+    for i in bad + [owners[j] for j in bad_amounts]:
+        costs[i] = None
+    return costs
+
+def cost_patches(parts, costs):
+    # {path: {line: (old cost, new cost)}} for the parts whose cost changes
+    patches = {}
+    for part, newcost in zip(parts, costs):
+        if newcost == None:
+            print("%s:%d: %s: bad mass or maxAmount"
+                  % (part.path, part.line, part.name))
             continue
-        pname = node.GetValue("name").strip()
-        mass = node.GetValue("mass").strip()
-        cost = node.GetValue("cost").strip()
-        costLine = node.GetValueLine("cost")
-        ecost = node.GetValue("entryCost").strip()
-        newcost = float(mass) * markup[part_type[pname]] * rp_cost
-        rescost = get_resource_cost(node.GetNodes("RESOURCE"))
-        #rescost = 0
-        c = float(cost)
-        m = float(mass)
-        #print ("%s c %s m %s c/m %f e %s n %g r %g n + r %g (c-r)/m %g %g" % (pname, cost, mass, c / m, ecost, newcost, rescost, newcost + rescost, (c - rescost) / m, (c - rescost) / m / rp_cost))
-        #print (r"sed -i -e '%ds/\<cost\>\s*=\s*%s\>/cost = %g\r\n\tTechRequired = specializedConstruction\r\n\tentryCost = 2000/' '%s'" % (costLine + lineoffs, cost, newcost + rescost, path))
-        if cost != ("%g" % (newcost + rescost)):
-            print (r"sed -i -e '%ds/\<cost\>\s*=\s*%s\>.*/cost = %g/' '%s'" % (costLine + lineoffs, cost, newcost + rescost, path))
-        #lineoffs += 2
+        cost = part.node.GetValue("cost").strip()
+        if cost != ("%g" % newcost):
+            line = part.node.GetValueLine("cost")
+            patches.setdefault(part.path, {})[line] = cost, "%g" % newcost
+    return patches
+
+def patch_file(path, changes, dry_run=False):
+    # Rewrite the cost lines of a file in one go. The file is handled as
+    # latin-1 so every other byte, line endings included, is kept.
+    lines = open(path, "rb").read().decode("latin-1").split("\n")
+    for line, (cost, newcost) in sorted(changes.items()):
+        # what sed -e 's/\<cost\>\s*=\s*cost\>.*/cost = newcost/' did,
+        # short of the \r of a CRLF line
+        text = lines[line - 1]
+        m = re.search(r"\bcost\s*=\s*%s\b[^\r]*" % re.escape(cost), text)
+        if not m:
+            print("%s:%d: cost %s not found" % (path, line, cost))
+            continue
+        print("%s:%d: cost %s -> %s" % (path, line, cost, newcost))
+        lines[line - 1] = (text[:m.start()] + "cost = " + newcost
+                           + text[m.end():])
+    if dry_run:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write("\n".join(lines).encode("latin-1"))
+    os.replace(tmp, path)
 
-recurse_tree("/home/bill/ksp/KSP_linux/GameData", find_resources)
+dry_run = "-n" in sys.argv[1:]
+find_all_resources("/home/bill/ksp/KSP_linux/GameData")
 pprint(resources)
-rp_cost = float(resources["RocketParts"].GetValue("unitCost")) / float(resources["RocketParts"].GetValue("density"))
-recurse_tree("/home/bill/ksp/KSP_linux/GameData/TalisarParts", find_parts)
-recurse_tree("/home/bill/ksp/src/Extraplanetary-Launchpads/GameData/ExtraplanetaryLaunchpads", find_parts)
-recurse_tree("/home/bill/ksp/KSP_linux/GameData/mystuff", find_parts)
+rocketparts = get_resource("RocketParts")
+rp_cost = rocketparts.unitCost / rocketparts.density
+parts = []
+for root in ("/home/bill/ksp/KSP_linux/GameData/TalisarParts",
+             "/home/bill/ksp/src/Extraplanetary-Launchpads/GameData/ExtraplanetaryLaunchpads",
+             "/home/bill/ksp/KSP_linux/GameData/mystuff"):
+    parts += PartCatalog.load(root).find(name=part_type)
+patches = cost_patches(parts, part_costs(parts))
+for path, changes in patches.items():
+    patch_file(path, changes, dry_run)
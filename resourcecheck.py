@@ -19,46 +19,14 @@
 
 # <pep8 compliant>
 
-from cfgnode import ConfigNode
+from savegame import ResourceInventory, SaveGameError
 import sys
 
-def find_module(part, name):
-    modules = part.GetNodes('MODULE')
-    for m in modules:
-        if m.GetValue('name') == name:
-            return m
-    return None
-
-def make_part_map(parts):
-    map = {}
-    for p in parts:
-        map[p.GetValue('uid')] = p
-    return map
-
-def check_resources(vessel, resource_set):
-    parts = vessel.GetNodes('PART')
-    part_map = make_part_map(parts)
-    count = 0
-    for p in parts:
-        resources = p.GetNodes('RESOURCE')
-        for res in resources:
-            resname = res.GetValue('name')
-            resource_set.add(resname.strip())
-
 for arg in sys.argv[1:]:
-    text = open(arg, "rt").read()
-    node = ConfigNode.load(text)
-    game = node.GetNode('GAME')
-    if not game:
-        print("could not find GAME")
-        sys.exit(1)
-    flightstate = game.GetNode("FLIGHTSTATE")
-    if not flightstate:
-        print("could not find FLIGHTSTATE")
+    try:
+        inventory = ResourceInventory.loadfile(arg)
+    except SaveGameError as e:
+        print(e.message)
         sys.exit(1)
-    vessels = flightstate.GetNodes("VESSEL")
-    resource_set = set()
-    for v in vessels:
-        check_resources(v, resource_set)
-    print(resource_set)
+    print(set(inventory.names))
     sys.exit(0)
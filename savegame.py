@@ -0,0 +1,188 @@
+# vim:ts=4:et
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+from array import array
+
+from cfgnode import *
+from cfgcolumns import float_column, sum_by, where_equal, take
+
+class SaveGameError(Exception):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.message = message
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+class VesselIndex:
+    # The parts of a VESSEL by index, built in one pass over them:
+    #   uid_index   part uid: index (the last part with the uid)
+    #   parent      index of each part's parent (None if not a number)
+    #   children    indices of each part's children
+    #   modules     module name: [(part index, MODULE node)] for all
+    #               modules, in part order
+    #   part_modules    per part, module name: its first MODULE of the name
+    def __init__(self, node):
+        self.node = node
+        self.parts = node.GetNodes("PART")
+        count = len(self.parts)
+        self.uid_index = {}
+        self.parent = [None] * count
+        self.children = [[] for i in range(count)]
+        self.modules = {}
+        self.part_modules = []
+        for i, part in enumerate(self.parts):
+            self.uid_index[part.GetValue("uid")] = i
+            parent = parse_int(part.GetValue("parent"))
+            self.parent[i] = parent
+            # a root part is its own parent
+            if parent != None and parent != i and 0 <= parent < count:
+                self.children[parent].append(i)
+            first = {}
+            for m in part.GetNodes("MODULE"):
+                name = m.GetValue("name")
+                if name in self.modules:
+                    self.modules[name].append((i, m))
+                else:
+                    self.modules[name] = [(i, m)]
+                if name not in first:
+                    first[name] = m
+            self.part_modules.append(first)
+    def name(self):
+        return self.node.GetValue("name")
+    def find_part(self, uid):
+        # the index of the part with the uid, or None
+        return self.uid_index.get(uid)
+    def find_module(self, index, name):
+        # the first module of the part with the name, or None
+        return self.part_modules[index].get(name)
+    def first_modules(self, name):
+        # (part index, module) for the first module of the name of each
+        # part that has one, in part order
+        return [(i, m[name]) for i, m in enumerate(self.part_modules)
+                if name in m]
+
+class SaveIndex:
+    # The vessels of GAME/FLIGHTSTATE in a save file, each as a VesselIndex
+    def __init__(self, node):
+        game = node.GetNode("GAME") if node else None
+        if not game:
+            raise SaveGameError("could not find GAME")
+        flightstate = game.GetNode("FLIGHTSTATE")
+        if not flightstate:
+            raise SaveGameError("could not find FLIGHTSTATE")
+        self.game = game
+        self.flightstate = flightstate
+        self.vessels = [VesselIndex(v) for v in flightstate.GetNodes("VESSEL")]
+    @classmethod
+    def loadfile(cls, path, nodeclass=ConfigNode):
+        return cls(nodeclass.loadfile(path, mapped=True))
+
+vessel_path = ['GAME', 'FLIGHTSTATE', 'VESSEL']
+part_path = vessel_path + ['PART']
+resource_path = part_path + ['RESOURCE']
+
+class ResourceInventory:
+    # Every PART RESOURCE of every vessel in a save as flat columns, one
+    # row per RESOURCE node:
+    #   vessel      index of the vessel in FLIGHTSTATE
+    #   part        index of the part in its vessel
+    #   resource    index of the resource's name in names
+    #   amount, maxAmount   (0 if not a number)
+    #   flowState   1 unless flowState = False
+    # Built from the event stream of a save (see cfgnode.parse_events), so
+    # no nodes are made. RESOURCE nodes without a name are left out.
+    def __init__(self, events):
+        self.vessel = array("i")
+        self.part = array("i")
+        self.resource = array("i")
+        self.flowState = array("b")
+        self.names = []
+        self.name_ids = {}
+        self.vessel_names = []
+        amounts = []
+        maxAmounts = []
+        path = []
+        seen = set()
+        vessel = part = -1
+        res = None
+        for event, key, value, line in events:
+            if event == START_NODE:
+                path.append(key)
+                if len(path) <= 2:
+                    seen.add(tuple(path))
+                if path == resource_path:
+                    res = {}
+                elif path == part_path:
+                    part += 1
+                elif path == vessel_path:
+                    vessel += 1
+                    part = -1
+                    self.vessel_names.append(None)
+            elif event == END_NODE:
+                if res != None and path == resource_path:
+                    name = res.get("name")
+                    if name != None:
+                        if name not in self.name_ids:
+                            self.name_ids[name] = len(self.names)
+                            self.names.append(name)
+                        self.vessel.append(vessel)
+                        self.part.append(part)
+                        self.resource.append(self.name_ids[name])
+                        amounts.append(res.get("amount"))
+                        maxAmounts.append(res.get("maxAmount"))
+                        flow = res.get("flowState", "True").upper()
+                        self.flowState.append(flow != "FALSE")
+                    res = None
+                path.pop()
+            elif res != None:
+                # the first of each value of the RESOURCE itself, as
+                # GetValue would give
+                if len(path) == len(resource_path) and key not in res:
+                    res[key] = value
+            elif key == 'name' and path == vessel_path:
+                if self.vessel_names[vessel] == None:
+                    self.vessel_names[vessel] = value
+        if ('GAME',) not in seen:
+            raise SaveGameError("could not find GAME")
+        if ('GAME', 'FLIGHTSTATE') not in seen:
+            raise SaveGameError("could not find FLIGHTSTATE")
+        self.amount = float_column(amounts)[0]
+        self.maxAmount = float_column(maxAmounts)[0]
+    @classmethod
+    def loadfile(cls, path):
+        return cls(iterloadfile(path))
+    def rows(self, name):
+        # the row indices for the resource of the given name
+        if name not in self.name_ids:
+            return []
+        return where_equal(self.resource, self.name_ids[name])
+    def vessel_totals(self, name, column="amount"):
+        # the sum of column (amount or maxAmount) of the named resource
+        # for each vessel
+        rows = self.rows(name)
+        return sum_by(take(getattr(self, column), rows),
+                      take(self.vessel, rows), len(self.vessel_names))
+    def total(self, name, column="amount"):
+        return sum(take(getattr(self, column), self.rows(name)))
@@ -19,6 +19,8 @@
 
 # <pep8 compliant>
 
+import re
+
 class ScriptError(Exception):
     def __init__(self, fname, line, message):
         Exception.__init__(self, "%s:%d: %s" % (fname, line, message))
@@ -117,3 +119,258 @@ class Script:
         return self.token
     def ungetToken(self):
         self.unget = True
+    def getText(self, start, end):
+        return self.text[start:end]
+    def skipBlock(self):
+        # Move past the } matching an already consumed {, without
+        # tokenizing the block. A } directly after a key token is part of
+        # the key, as it is for the parsers, so it does not close the block.
+        text = self.text
+        start = self.pos
+        depth = 1
+        in_key = False
+        for m in _block_re.finditer(text, start):
+            kind = m.lastgroup
+            if kind == None:
+                continue
+            if kind == "tok":
+                if in_key or m.group() != "\xef\xbb\xbf":
+                    in_key = True
+            elif kind == "close" and not in_key:
+                depth -= 1
+                if not depth:
+                    self.pos = m.end()
+                    self.line += text.count("\n", start, self.pos)
+                    return True
+            elif kind != "close":
+                in_key = False
+                if kind == "open":
+                    depth += 1
+        self.pos = len(text)
+        self.line += text.count("\n", start, self.pos)
+        return False
+
+_space_crossline = re.compile(r"(?:\s|[\x1a\x04]|//[^\n]*)*")
+_space_inline = re.compile(r"(?:[^\S\n]|[\x1a\x04])*")
+_token_patterns = {}
+_block_re = re.compile(r"""
+    (?P<kv>(?:\s*[^\s{}=/][^\s{}=]*[^\S\n]*=(?:[^\n/]|/(?!/))*)+)
+    |(?P<open>\s*(?:[^\s{}=/][^\s{}=]*\s*)?{)
+    |(?P<close>\s*})
+    |\s+|[\x1a\x04]+|//[^\n]*
+    |(?P<tok>[^\s{}=]+)
+    |(?P<eq>=(?:[^\n/]|/(?!/))*)
+    """, re.VERBOSE)
+
+def _token_pattern(single):
+    if single not in _token_patterns:
+        chars = "".join(re.escape(c) for c in single)
+        _token_patterns[single] = re.compile(r"[^\s%s]+" % chars)
+    return _token_patterns[single]
+
+class FastScript(Script):
+    # Same token stream and line numbers as Script, but scans runs of
+    # whitespace, comments and token characters with compiled regexes and
+    # str.find rather than one character at a time.
+    def __init__(self, filename, text, single="{}()':", quotes=True):
+        Script.__init__(self, filename, text, single, quotes)
+        self.token_re = _token_pattern(single)
+    def tokenAvailable(self, crossline=False):
+        if self.unget:
+            return True
+        text = self.text
+        pos = self.pos
+        if crossline:
+            end = _space_crossline.match(text, pos).end()
+            if end != pos:
+                self.line += text.count("\n", pos, end)
+                self.pos = end
+            return end < len(text)
+        pos = _space_inline.match(text, pos).end()
+        if text.startswith("//", pos):
+            end = text.find("\n", pos)
+            if end < 0:
+                end = len(text)
+            self.pos = end
+            return False
+        self.pos = pos
+        return pos < len(text) and text[pos] != "\n"
+    def getLine(self):
+        text = self.text
+        start = self.pos
+        nl = text.find("\n", start)
+        if nl < 0:
+            nl = len(text)
+        end = text.find("//", start, nl)
+        if end >= 0:
+            self.pos = end
+        elif nl < len(text):
+            end = nl
+            self.pos = nl + 1
+            self.line += 1
+        else:
+            end = self.pos = nl
+        if self.unget:
+            self.unget = False
+            self.token = self.token + text[start:end]
+        else:
+            self.token = text[start:end]
+        return self.pos < len(text)
+    def getToken(self, crossline=False):
+        if self.unget:
+            self.unget = False
+            return self.token
+        if not self.tokenAvailable(crossline):
+            if not crossline:
+                self.error("line is incomplete")
+            return None
+        text = self.text
+        start = self.pos
+        if self.quotes and text[start] == "\"":
+            end = text.find("\"", start + 1)
+            if end < 0:
+                self.error("EOF inside quoted string")
+                return None
+            self.line += text.count("\n", start, end)
+            self.token = text[start + 1:end]
+            self.pos = end + 1
+        elif text[start] in self.single:
+            self.token = text[start]
+            self.pos = start + 1
+        else:
+            self.pos = self.token_re.match(text, start).end()
+            self.token = text[start:self.pos]
+        return self.token
+
+_bspace = rb"\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0"
+_bspace_crossline = re.compile(rb"(?:[%s\x1a\x04]|//[^\n]*)*" % _bspace)
+_binline = rb"\t\x0b\x0c\r\x1c-\x1f \x85\xa0"
+_bspace_inline = re.compile(rb"[%s\x1a\x04]*" % _binline)
+_btoken_patterns = {}
+_bblock_re = re.compile(rb"""
+    (?P<kv>(?:[%s]*[^%s{}=/][^%s{}=]*[%s]*=(?:[^\n/]|/(?!/))*)+)
+    |(?P<open>[%s]*(?:[^%s{}=/][^%s{}=]*[%s]*)?{)
+    |(?P<close>[%s]*})
+    |[%s]+|[\x1a\x04]+|//[^\n]*
+    |(?P<tok>[^%s{}=]+)
+    |(?P<eq>=(?:[^\n/]|/(?!/))*)
+    """ % ((_bspace,) * 3 + (_binline,) + (_bspace,) * 7),
+    re.VERBOSE)
+
+def _btoken_pattern(single):
+    if single not in _btoken_patterns:
+        chars = re.escape(single.encode("latin-1"))
+        _btoken_patterns[single] = re.compile(rb"[^%s%s]+" % (_bspace, chars))
+    return _btoken_patterns[single]
+
+class ByteScript(FastScript):
+    # FastScript over a bytes-like object (bytes or mmap) holding latin-1
+    # text. Only the tokens and lines handed back are decoded, so a file
+    # can be tokenized straight from a memory map.
+    def __init__(self, filename, text, single="{}()':", quotes=True):
+        self.filename = filename
+        self.text = text
+        self.single = single
+        self.bsingle = single.encode("latin-1")
+        self.quotes = quotes
+        self.pos = 0
+        if text[0:3] == b"\xef\xbb\xbf":
+            self.pos = 3
+        self.line = 1
+        self.unget = False
+        self.token_re = _btoken_pattern(single)
+    def getText(self, start, end):
+        return self.text[start:end].decode("latin-1")
+    def skipBlock(self):
+        text = self.text
+        start = self.pos
+        depth = 1
+        in_key = False
+        for m in _bblock_re.finditer(text, start):
+            kind = m.lastgroup
+            if kind == None:
+                continue
+            if kind == "tok":
+                if in_key or m.group() != b"\xef\xbb\xbf":
+                    in_key = True
+            elif kind == "close" and not in_key:
+                depth -= 1
+                if not depth:
+                    self.pos = m.end()
+                    self.line += text[start:self.pos].count(b"\n")
+                    return True
+            elif kind != "close":
+                in_key = False
+                if kind == "open":
+                    depth += 1
+        self.pos = len(text)
+        self.line += text[start:self.pos].count(b"\n")
+        return False
+    def tokenAvailable(self, crossline=False):
+        if self.unget:
+            return True
+        text = self.text
+        pos = self.pos
+        if crossline:
+            end = _bspace_crossline.match(text, pos).end()
+            if end != pos:
+                self.line += text[pos:end].count(b"\n")
+                self.pos = end
+            return end < len(text)
+        pos = _bspace_inline.match(text, pos).end()
+        if text[pos:pos + 2] == b"//":
+            end = text.find(b"\n", pos)
+            if end < 0:
+                end = len(text)
+            self.pos = end
+            return False
+        self.pos = pos
+        return pos < len(text) and text[pos] != 10
+    def getLine(self):
+        text = self.text
+        start = self.pos
+        nl = text.find(b"\n", start)
+        if nl < 0:
+            nl = len(text)
+        end = text.find(b"//", start, nl)
+        if end >= 0:
+            self.pos = end
+        elif nl < len(text):
+            end = nl
+            self.pos = nl + 1
+            self.line += 1
+        else:
+            end = self.pos = nl
+        line = text[start:end].decode("latin-1")
+        if self.unget:
+            self.unget = False
+            self.token = self.token + line
+        else:
+            self.token = line
+        return self.pos < len(text)
+    def getToken(self, crossline=False):
+        if self.unget:
+            self.unget = False
+            return self.token
+        if not self.tokenAvailable(crossline):
+            if not crossline:
+                self.error("line is incomplete")
+            return None
+        text = self.text
+        start = self.pos
+        first = text[start:start + 1]
+        if self.quotes and first == b"\"":
+            end = text.find(b"\"", start + 1)
+            if end < 0:
+                self.error("EOF inside quoted string")
+                return None
+            self.line += text[start:end].count(b"\n")
+            self.token = text[start + 1:end].decode("latin-1")
+            self.pos = end + 1
+        elif first in self.bsingle:
+            self.token = first.decode("latin-1")
+            self.pos = start + 1
+        else:
+            self.pos = self.token_re.match(text, start).end()
+            self.token = text[start:self.pos].decode("latin-1")
+        return self.token
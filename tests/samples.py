@@ -0,0 +1,46 @@
+# vim:ts=4:et
+# Config texts shared by the parser equivalence tests
+
+texts = {
+    "nested": (
+        "// a comment\n"
+        "PART\n"
+        "{\n"
+        "\tname = tank   // trailing comment\n"
+        "\tmass = 0.5\n"
+        "\tempty =\n"
+        "\tMODULE\n"
+        "\t{\n"
+        "\t\tname = ModuleEngines\n"
+        "\t\tPROPELLANT { name = LiquidFuel\n"
+        "\t\t}\n"
+        "\t}\n"
+        "\tRESOURCE\n"
+        "\t{\n"
+        "\t}\n"
+        "}\n"
+    ),
+    "crlf": "A\r\n{\r\n\tx = 1\r\n\t// c\r\n\tB\r\n\t{\r\n\t\ty = 2 3\r\n\t}\r\n}\r\n",
+    "bom": "\xef\xbb\xbfA\n{\n\tx = 1\n}\n",
+    "multi_key": (
+        "@PART[tank] :NEEDS[Mod]\n"
+        "{\n"
+        "\t@mass *= 2\n"
+        "\tkey with spaces = value with spaces\n"
+        "}\n"
+    ),
+    "eof_chars": "A\n{\n\tx = 1\n}\n\x1a",
+    "no_newline": "A { x = 1\n} B { y = 2\n}",
+    "top_values": "x = 1\ny = 2 // c\nA\n{\n}\n",
+    "comment_only": "// nothing here\n",
+    "empty": "",
+    "latin1": "A\n{\n\tname = caf\xe9\n}\n",
+}
+
+errors = {
+    "unterminated": "A\n{\n\tx = 1\n",
+    "unterminated_nested": "A\n{\n\tB\n\t{\n\t\tx = 1\n}\n",
+    "unexpected_close": "x = 1\n}\n",
+    "unexpected_equals": "A\n{\n\t= 1\n}\n",
+    "unexpected_open": "A\n{\n{\n}\n}\n",
+}
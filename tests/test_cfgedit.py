@@ -0,0 +1,121 @@
+# vim:ts=4:et
+
+import unittest
+
+from cfgnode import ConfigNode
+from cfgedit import ConfigEditor, SourceConfigNode
+
+class TestConfigEditor(unittest.TestCase):
+    def test_untouched(self):
+        text = b"// c\r\nA\r\n{\r\n\tx = 1 // one\r\n}\r\n"
+        self.assertEqual(ConfigEditor(text).GetText(), text)
+
+    def test_set_value_twice(self):
+        for text in (b"A\n{\n\tk =\n}\n", b"A\n{\n\tk = old\n}\n"):
+            edit = ConfigEditor(text)
+            a = edit.root.GetNode("A")
+            edit.SetValue(a, "k", "first")
+            edit.SetValue(a, "k", "second")
+            self.assertEqual(edit.GetText(), b"A\n{\n\tk = second\n}\n")
+
+    def test_set_then_remove(self):
+        edit = ConfigEditor(b"A\n{\n\tk = old\n\tj = 1\n}\n")
+        a = edit.root.GetNode("A")
+        edit.SetValue(a, "k", "new")
+        edit.RemoveValue(a, 0)
+        self.assertEqual(edit.GetText(), b"A\n{\n\tj = 1\n}\n")
+
+    def test_add_and_remove(self):
+        edit = ConfigEditor(b"A\r\n{\r\n\tB\r\n\t{\r\n\t}\r\n}\r\n")
+        a = edit.root.GetNode("A")
+        edit.RemoveNode(a, 0)
+        edit.AddValue(a, "k", "v")
+        edit.SetValue(a, "k", "w")
+        self.assertEqual(edit.GetText(), b"A\r\n{\r\n\tk = w\r\n}\r\n")
+
+    def test_edit_then_remove(self):
+        text = b"V\n{\n\tname = a\n\tP\n\t{\n\t\tk = 1\n\t}\n}\nW\n{\n}\n"
+        edits = (lambda e, v: e.SetValue(v, "name", "z"),
+                 lambda e, v: e.AddValue(v, "x", "y"),
+                 lambda e, v: e.RemoveValue(v, 0),
+                 lambda e, v: e.SetValue(v.GetNode("P"), "k", "2"),
+                 lambda e, v: e.RemoveValue(v.GetNode("P"), 0),
+                 lambda e, v: e.AddNode(v.GetNode("P"), "Q", ConfigNode()))
+        for op in edits:
+            edit = ConfigEditor(text)
+            op(edit, edit.root.nodes[0][1])
+            edit.RemoveNode(edit.root, 0)
+            self.assertEqual(edit.GetText(), b"W\n{\n}\n")
+        edit = ConfigEditor(text)
+        v = edit.root.GetNode("V")
+        edit.SetValue(v.GetNode("P"), "k", "2")
+        edit.AddValue(v, "x", "y")
+        edit.RemoveNode(v, 0)
+        self.assertEqual(edit.GetText(),
+                         b"V\n{\n\tname = a\n\tx = y\n}\nW\n{\n}\n")
+
+    def test_edit_added_node(self):
+        edit = ConfigEditor(b"A\n{\n}\n")
+        a = edit.root.GetNode("A")
+        b = ConfigNode()
+        b.AddValue("k", "1")
+        edit.AddNode(a, "B", b)
+        edit.SetValue(b, "k", "2")
+        edit.AddValue(b, "j", "3")
+        c = ConfigNode()
+        edit.AddNode(b, "C", c)
+        edit.AddValue(c, "i", "4")
+        edit.RemoveValue(b, 0)
+        self.assertEqual(edit.GetText(), b"A\n{\n\tB\n\t{\n\t\tj = 3\n"
+                         b"\t\tC\n\t\t{\n\t\t\ti = 4\n\t\t}\n\t}\n}\n")
+        edit.RemoveNode(b, 0)
+        edit.RemoveNode(a, 0)
+        edit.AddValue(c, "h", "5")
+        self.assertEqual(edit.GetText(), b"A\n{\n}\n")
+
+class TestSourceConfigNode(unittest.TestCase):
+    text = (b"// header\r\n"
+            b"A\r\n"
+            b"{\r\n"
+            b"\tk = 1  // first\r\n"
+            b"\tj = x\r\n"
+            b"\tk = 2  // second\r\n"
+            b"\tB { y = 1\r\n"
+            b"\t}\r\n"
+            b"}\r\n")
+
+    def test_untouched(self):
+        root = SourceConfigNode.load(self.text)
+        self.assertEqual(root.GetSource(), self.text)
+
+    def test_set_value(self):
+        root = SourceConfigNode.load(self.text)
+        root.GetNode("A").SetValue("j", "z")
+        self.assertEqual(root.GetSource(),
+                         self.text.replace(b"j = x", b"j = z"))
+
+    def test_order_kept(self):
+        root = SourceConfigNode.load(self.text)
+        a = root.GetNode("A")
+        a.values = [a.values[0], a.values[1], ("k", "new", 0)]
+        self.assertEqual(root.GetSource(),
+                         self.text.replace(b"k = 2", b"k = new"))
+        a.values = [a.values[1], a.values[0], ("k", "1", 0)]
+        out = root.GetSource()
+        self.assertEqual([v[:2] for v in ConfigNode.load(
+            out.decode("latin-1")).GetNode("A").values],
+                         [("k", "1"), ("j", "x"), ("k", "1")])
+
+    def test_add_and_remove(self):
+        root = SourceConfigNode.load(self.text)
+        a = root.GetNode("A")
+        del a.values[1]
+        a.GetNode("B").AddValue("z", "2")
+        a.AddNewNode("C").AddValue("w", "3")
+        self.assertEqual(root.GetSource(), b"// header\r\nA\r\n{\r\n"
+                         b"\tk = 1  // first\r\n\tk = 2  // second\r\n"
+                         b"\tB { y = 1\r\n\t\tz = 2\r\n\t}\r\n"
+                         b"\tC\r\n\t{\r\n\t\tw = 3\r\n\t}\r\n}\r\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+# vim:ts=4:et
+# The ConfigNode parsers against the reference Script/ParseNode path
+
+import os
+import pickle
+import tempfile
+import unittest
+
+from cfgnode import *
+from samples import texts, errors
+
+def flatten(node):
+    # values and nodes with line numbers, whatever the node class
+    if type(node) == list:
+        return [flatten(n) for n in node]
+    return ([tuple(v) for v in node.values],
+            [(n[0], n[2], flatten(n[1])) for n in node.nodes])
+
+def from_events(events):
+    root = node = ConfigNode()
+    stack = []
+    for event, key, value, line in events:
+        if event == START_NODE:
+            child = ConfigNode()
+            node.nodes.append((key, child, line))
+            stack.append(node)
+            node = child
+        elif event == VALUE:
+            node.values.append((key, value, line))
+        else:
+            node = stack.pop()
+    return root
+
+def reference(text):
+    return ConfigNode.load(text)
+
+def parsers(text):
+    # (name, parse) for each way of loading text that should agree with
+    # the reference
+    yield "FastScript", lambda: ConfigNode.load(text, FastScript)
+    yield "ParseTree", lambda: ConfigNode.load(text, iterative=True)
+    yield "ParseTree FastScript", lambda: ConfigNode.load(text, FastScript,
+                                                          True)
+    yield "Lazy", lambda: flatten(LazyConfigNode.load(text))
+    yield "Compact", lambda: CompactConfigNode.load(text, iterative=True)
+    yield "events", lambda: from_events(iterload(text))
+    yield "strings", lambda: ConfigNode.load(text, strings=InternTable())
+
+class TestParsers(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def file_parsers(self, name, text):
+        path = os.path.join(self.tmp.name, name + ".cfg")
+        with open(path, "wb") as f:
+            f.write(text.encode("latin-1"))
+        yield "mapped", lambda: ConfigNode.loadfile(path, mapped=True)
+        yield "mapped ParseTree", lambda: ConfigNode.loadfile(path,
+                                            iterative=True, mapped=True)
+        yield "mapped events", lambda: from_events(iterloadfile(path))
+        yield "mapped Lazy", lambda: flatten(
+            LazyConfigNode.loadfile(path, mapped=True))
+
+    def all_parsers(self, name, text):
+        return list(parsers(text)) + list(self.file_parsers(name, text))
+
+    def test_trees(self):
+        for name, text in texts.items():
+            expect = flatten(reference(text))
+            for parser, parse in self.all_parsers(name, text):
+                result = parse()
+                if type(result) != tuple:
+                    result = flatten(result)
+                # the reference gives [] for an empty file, ParseTree an
+                # empty root
+                if expect == [] and result == ([], []):
+                    continue
+                self.assertEqual(result, expect, (name, parser))
+
+    def test_errors(self):
+        for name, text in errors.items():
+            with self.assertRaises(ConfigNodeError) as cm:
+                reference(text)
+            expect = cm.exception.line, cm.exception.text
+            for parser, parse in self.all_parsers(name, text):
+                with self.assertRaises(ConfigNodeError, msg=parser) as cm:
+                    parse()
+                self.assertEqual((cm.exception.line, cm.exception.text),
+                                 expect, (name, parser))
+
+    def test_serializers(self):
+        for name, text in texts.items():
+            node = reference(text)
+            if type(node) == list:
+                continue
+            for level in (0, -1, 2):
+                self.assertEqual("".join(node.IterLines(level)),
+                                 node.ToString(level), (name, level))
+
+class TestIndex(unittest.TestCase):
+    def make(self, cls):
+        node = cls()
+        for i in range(10):
+            node.AddValue("k%d" % i, str(i))
+            node.AddNewNode("N%d" % i).AddValue("i", str(i))
+        # build the indices
+        self.assertEqual(node.GetValue("k3"), "3")
+        self.assertEqual(node.GetNode("N3").GetValue("i"), "3")
+        return node
+
+    def test_same_length_changes(self):
+        # a plain list needs its index reset, an EntryTable resets it
+        for cls in (ConfigNode, CompactConfigNode):
+            node = self.make(cls)
+            node.values[3] = ("other", "x", 0)
+            node.value_index = None
+            self.assertEqual(node.GetValue("k3"), None, cls)
+            self.assertEqual(node.GetValue("other"), "x", cls)
+            node.nodes[0] = ("M", cls(), 0)
+            node.node_index = None
+            self.assertFalse(node.HasNode("N0"), cls)
+            self.assertTrue(node.HasNode("M"), cls)
+        node = self.make(CompactConfigNode)
+        node.values[3] = ("other", "x", 0)
+        self.assertEqual(node.GetValue("other"), "x")
+
+    def test_del_and_append(self):
+        for cls in (ConfigNode, CompactConfigNode):
+            node = self.make(cls)
+            del node.values[0]
+            node.values.append(("k0", "again", 0))
+            node.value_index = None
+            self.assertEqual(node.GetValue("k1"), "1", cls)
+            self.assertEqual(node.GetValues("k0"), ["again"], cls)
+            del node.nodes[0]
+            node.nodes.append(("N0", cls(), 0))
+            node.node_index = None
+            self.assertEqual(node.GetNode("N1").GetValue("i"), "1", cls)
+        node = self.make(CompactConfigNode)
+        del node.values[0]
+        node.values.append(("k0", "again", 0))
+        self.assertEqual(node.GetValues("k0"), ["again"])
+
+    def test_index_kept(self):
+        # the mutators update the index in place rather than rebuilding it
+        for cls in (ConfigNode, CompactConfigNode):
+            node = self.make(cls)
+            index = node.value_index[0]
+            node.AddValue("k3", "again")
+            node.SetValue("k4", "four")
+            self.assertIs(node.value_index[0], index, cls)
+            self.assertEqual(node.GetValues("k3"), ["3", "again"], cls)
+            self.assertEqual(node.GetValue("k4"), "four", cls)
+
+    def test_pickle(self):
+        # the indices are left out of the pickled state
+        for cls in (ConfigNode, CompactConfigNode):
+            node = pickle.loads(pickle.dumps(self.make(cls)))
+            self.assertEqual(node.value_index, None, cls)
+            self.assertEqual(node.GetNode("N3").GetValue("i"), "3", cls)
+            self.assertEqual(node.GetValue("k9"), "9", cls)
+
+    def test_list_api(self):
+        # the values of a CompactConfigNode behave as a list would
+        node = CompactConfigNode()
+        entries = []
+        for i in range(6):
+            node.values.append(("k%d" % i, str(i), i))
+            entries.append(("k%d" % i, str(i), i))
+        def check(op):
+            op(node.values)
+            op(entries)
+            self.assertEqual(list(node.values), entries)
+            self.assertEqual(len(node.values), len(entries))
+        self.assertEqual(node.values[1:4], entries[1:4])
+        self.assertEqual(node.values[::-2], entries[::-2])
+        self.assertEqual(node.values[-1], entries[-1])
+        self.assertRaises(IndexError, lambda: node.values[6])
+        self.assertRaises(IndexError, lambda: node.values[-7])
+        check(lambda l: l.insert(0, ("a", "x", 9)))
+        check(lambda l: l.insert(-1, ("b", "y", 9)))
+        check(lambda l: l.insert(99, ("c", "z", 9)))
+        check(lambda l: l.__delitem__(2))
+        check(lambda l: l.__delitem__(-1))
+        check(lambda l: l.__delitem__(slice(1, 3)))
+        check(lambda l: l.__setitem__(slice(0, 1), [("d", "w", 1)] * 2))
+        self.assertEqual(node.values.pop(), entries.pop())
+        self.assertEqual(node.GetValue("d"), "w")
+        self.assertEqual(node.GetValue("k3"), "3")
+        check(lambda l: l.__delitem__(slice(None)))
+        self.assertEqual(node.GetValue("d"), None)
+
+    def test_mutators(self):
+        for cls in (ConfigNode, CompactConfigNode):
+            node = self.make(cls)
+            node.SetValue("k2", "two")
+            node.AddValue("k2", "second")
+            node.AddValue("new", "n")
+            self.assertEqual(node.GetValues("k2"), ["two", "second"], cls)
+            self.assertEqual(node.GetValue("new"), "n", cls)
+
+if __name__ == "__main__":
+    unittest.main()
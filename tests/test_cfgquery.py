@@ -0,0 +1,108 @@
+# vim:ts=4:et
+# stream must give what select gives on the tree, in the same order
+
+import unittest
+
+from cfgnode import ConfigNode, iterload
+from cfgquery import compile_query, QueryError
+
+text = """
+GAME
+{
+    version = 1.12
+    FLIGHTSTATE
+    {
+        VESSEL
+        {
+            name = Ship
+            type = Ship
+            PART
+            {
+                name = mk1pod
+                uid = 1
+                MODULE
+                {
+                    name = ModuleDockingNode
+                    state = Ready
+                    dockUId = 2
+                }
+            }
+        }
+        VESSEL
+        {
+            PART
+            {
+                name = flag
+                uid = 5
+            }
+            name = Late Flag
+            type = Flag
+        }
+        VESSEL
+        {
+            name = Flag
+            type = Flag
+            PART
+            {
+                name = flag
+                uid = 6
+            }
+        }
+    }
+}
+A
+{
+    B
+    {
+        id = 1
+    }
+    name = a
+    B
+    {
+        id = 2
+    }
+}
+"""
+
+queries = [
+    "GAME/FLIGHTSTATE/VESSEL[type=Flag]/PART[name=flag]",
+    "GAME/FLIGHTSTATE/VESSEL[type=Flag]/PART/@uid",
+    "GAME/FLIGHTSTATE/VESSEL[type!=Flag]/@name",
+    "GAME/FLIGHTSTATE/*/PART/MODULE[name=ModuleDockingNode][state]/@dockUId",
+    "GAME/FLIGHTSTATE/VESSEL[!type]",
+    "GAME/FLIGHTSTATE/VESSEL[type]/@name",
+    "GAME/@version",
+    "A[name=a]/B/@id",
+    "A[name=b]/B",
+    "A/B[id=2]",
+]
+
+def flatten(node):
+    return ([tuple(v[:2]) for v in node.values],
+            [(n[0], flatten(n[1])) for n in node.nodes])
+
+def results(items):
+    return [r if isinstance(r, str) else flatten(r) for r in items]
+
+class TestQuery(unittest.TestCase):
+    def test_stream_matches_select(self):
+        root = ConfigNode.load(text, iterative=True)
+        for path in queries:
+            query = compile_query(path)
+            self.assertEqual(results(query.stream(iterload(text))),
+                             results(query.select(root)), path)
+
+    def test_held_results_keep_order(self):
+        query = compile_query("A[name=a]/B/@id")
+        text = "A { B { id = 1\n}\nname = a\nB { id = 2\n}\n}\n"
+        self.assertEqual(list(query.stream(iterload(text))), ["1", "2"])
+
+    def test_compile_cached(self):
+        self.assertIs(compile_query("A/B"), compile_query("A/B"))
+
+    def test_errors(self):
+        for path in ["", "A//B", "A[x", "@a/B", "A/@b[c=d]", "A]"]:
+            self.assertRaises(QueryError, compile_query, path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# vim:ts=4:et
+
+import unittest
+
+from cfgnode import ConfigNode, iterload
+from savegame import ResourceInventory, SaveGameError
+
+save = """
+GAME
+{
+    FLIGHTSTATE
+    {
+        VESSEL
+        {
+            name = First
+            name = Second
+            PART
+            {
+                RESOURCE
+                {
+                    name = LiquidFuel
+                    amount = 10
+                    maxAmount = 20
+                    amount = 99
+                    EXTRA
+                    {
+                        name = Oxidizer
+                        amount = 5
+                        flowState = False
+                    }
+                }
+                RESOURCE
+                {
+                    name = Oxidizer
+                    amount = 3
+                    maxAmount = 4
+                    flowState = False
+                }
+            }
+        }
+    }
+}
+"""
+
+class TestResourceInventory(unittest.TestCase):
+    def test_matches_tree(self):
+        inventory = ResourceInventory(iterload(save))
+        game = ConfigNode.load(save).GetNode("GAME")
+        vessel = game.GetNode("FLIGHTSTATE").GetNode("VESSEL")
+        self.assertEqual(inventory.vessel_names, [vessel.GetValue("name")])
+        rows = []
+        for part in vessel.GetNodes("PART"):
+            for res in part.GetNodes("RESOURCE"):
+                rows.append((res.GetValue("name"),
+                             float(res.GetValue("amount")),
+                             float(res.GetValue("maxAmount")),
+                             res.GetValue("flowState") != "False"))
+        self.assertEqual([(inventory.names[inventory.resource[i]],
+                           inventory.amount[i], inventory.maxAmount[i],
+                           bool(inventory.flowState[i]))
+                          for i in range(len(inventory.resource))], rows)
+
+    def test_missing_game(self):
+        self.assertRaises(SaveGameError, ResourceInventory,
+                          iterload("OTHER\n{\n}\n"))
+
+if __name__ == "__main__":
+    unittest.main()
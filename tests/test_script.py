@@ -0,0 +1,70 @@
+# vim:ts=4:et
+# FastScript and ByteScript against the reference Script tokenizer
+
+import unittest
+
+from script import Script, FastScript, ByteScript
+from samples import texts, errors
+
+def tokens(script):
+    result = []
+    while True:
+        token = script.getToken(True)
+        if token == None:
+            return result
+        result.append((token, script.line))
+
+def lines(script):
+    # the tokens and rest-of-line values as ConfigNode reads them
+    result = []
+    while script.tokenAvailable(True):
+        token = script.getToken(True)
+        result.append((token, script.line))
+        if token == "=":
+            if script.tokenAvailable(False):
+                script.getLine()
+                result.append((script.token, script.line))
+    return result
+
+def scripts(text, *args):
+    yield FastScript("", text, *args)
+    yield ByteScript("", text.encode("latin-1"), *args)
+
+class TestTokenizers(unittest.TestCase):
+    def check(self, walk, *args):
+        for name, text in list(texts.items()) + list(errors.items()):
+            expect = walk(Script("", text, *args))
+            for script in scripts(text, *args):
+                self.assertEqual(walk(script), expect,
+                                 (name, type(script).__name__))
+
+    def test_config_tokens(self):
+        self.check(tokens, "{}=", False)
+
+    def test_default_tokens(self):
+        self.check(tokens)
+
+    def test_config_lines(self):
+        self.check(lines, "{}=", False)
+
+    def test_quoted(self):
+        text = 'a "quoted string" (b) \'c\'\n"two\nlines" d\n'
+        expect = tokens(Script("", text))
+        for script in scripts(text):
+            self.assertEqual(tokens(script), expect)
+
+    def test_skip_block(self):
+        text = "A\n{\n\tB { x = }\n\t}\n// }\n\ty = {\n}\nC\n"
+        ref = Script("", text, "{}=", False)
+        ref.getToken(True)
+        ref.getToken(True)
+        ref.skipBlock()
+        expect = ref.getToken(True), ref.line
+        for script in scripts(text, "{}=", False):
+            script.getToken(True)
+            script.getToken(True)
+            script.skipBlock()
+            self.assertEqual((script.getToken(True), script.line), expect)
+
+if __name__ == "__main__":
+    unittest.main()